@@ -3,13 +3,27 @@ import sys
 
 import pandas as pd
 import requests as rq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import gzip
 import json
 import csv
 import math
-from datetime import datetime, timedelta
+import hashlib
+import io
+import sqlite3
+import time
+from collections import deque
+from urllib.parse import quote
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from logzero import logger, LogFormatter, setup_default_logger
 import logzero
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import re
 import pickle
@@ -18,6 +32,21 @@ import unicodedata
 import getpass
 import maskpass  # importing maskpass library
 
+try:
+    import ijson  # optional: incremental JSON parsing for streamed dataValueSets pulls
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # optional: faster serialization of metadata and dataValues payloads
+except ImportError:
+    orjson = None
+
+try:
+    import httpx  # optional: asyncio transport for issuing many GETs in parallel
+except ImportError:
+    httpx = None
+
 class LogFormat:
     def __init__(self, log_file_name, destination_folder):
 
@@ -48,12 +77,110 @@ class LogFormat:
         # Return the global logger for use in other classes
         return logger
 
+class GzipSession(rq.Session):
+    """requests Session that gzips request bodies of at least 'min_bytes' and marks them Content-Encoding: gzip."""
+    def __init__(self, min_bytes=1024):
+        super().__init__()
+        self.min_bytes = min_bytes
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if isinstance(data, bytes) and len(data) >= self.min_bytes:
+            data = gzip.compress(data, compresslevel=5)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        return super().request(method, url, data=data, headers=headers, **kwargs)
+
+class Transport:
+    """
+    Builds the HTTP sessions used by Connection and the Engine.
+
+    Every session gets a connection pool of 'pool_size' per host, keep-alive, gzip response compression and
+    retries with exponential backoff ('backoff_factor' * 2 ** retry seconds, honouring Retry-After) on
+    connection errors, read timeouts and the 'retry_statuses' responses. POSTs are only retried on connection
+    errors by default: Engine.push_batch owns their retries so the AdaptiveBatcher sees every slow or failed
+    import, and an async import retried here would queue a duplicate job. 'retry_posts' retries them here too.
+    'compress_requests' gzips request bodies as well; only enable it when the server (or its reverse proxy)
+    accepts gzip-encoded request bodies.
+
+    async_get_many() is the asyncio variant: it issues many GETs against the same host concurrently through
+    httpx, with the same pool size, retry statuses and backoff. Engine.get_many_url_data falls back to a
+    thread pool over the pooled requests session when httpx is not installed.
+    """
+    def __init__(self, pool_size=20, retries=5, backoff_factor=1.0, retry_statuses=(429, 500, 502, 503, 504),
+                 retry_posts=False, compress_requests=False, compress_min_bytes=1024, log=None):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_posts = retry_posts
+        self.compress_requests = compress_requests
+        self.compress_min_bytes = compress_min_bytes
+        self.logger = log if log else logzero.logger
+
+    def session(self):
+        session = GzipSession(self.compress_min_bytes) if self.compress_requests else rq.Session()
+        methods = {"HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"}
+        if self.retry_posts:
+            methods.add("POST")
+        retry = Retry(total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+                      backoff_factor=self.backoff_factor, status_forcelist=self.retry_statuses,
+                      allowed_methods=frozenset(methods), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        return session
+
+    @staticmethod
+    def retry_after(value, default):
+        # Retry-After is either a number of seconds or an HTTP date
+        if value is None:
+            return default
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return default
+
+    def get_many(self, urls, auth, timeout):
+        """Run async_get_many on a fresh event loop and return the parsed JSON bodies in the order of 'urls'."""
+        return asyncio.run(self.async_get_many(urls, auth, timeout))
+
+    async def async_get_many(self, urls, auth, timeout):
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        async with httpx.AsyncClient(auth=auth, limits=limits, timeout=timeout,
+                                     headers={"Accept-Encoding": "gzip, deflate"}) as client:
+            return await asyncio.gather(*(self._async_get(client, url) for url in urls))
+
+    async def _async_get(self, client, url):
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.get(url)
+                if response.status_code not in self.retry_statuses or attempt == self.retries:
+                    return response.json()
+                delay = self.retry_after(response.headers.get("Retry-After"), self.backoff_factor * 2 ** attempt)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    self.logger.debug(f"[Transport] GET {url} failed: {e}")
+                    return {}
+                delay = self.backoff_factor * 2 ** attempt
+            except ValueError as e:
+                self.logger.debug(f"[Transport] Failed to parse JSON from {url}: {e}")
+                return {}
+            await asyncio.sleep(delay)
+        return {}
+
 class Connection:
-    def __init__(self, log=None, timeout=5):
+    def __init__(self, log=None, timeout=5, transport=None):
         # Initialize logger, expecting it to be passed from LogFormat
         self.logger = log if log else logzero.logger
-        self.source_session = rq.Session()
-        self.destination_session = rq.Session()
+        self.transport = transport if transport else Transport(log=self.logger)
+        self.source_session = self.transport.session()
+        self.destination_session = self.transport.session()
         self.source_session.auth = None
         self.destination_session.auth = None
         self.source_base_url = None
@@ -163,8 +290,346 @@ class Connection:
     def get_destination_session(self):
         return self.destination_session
 
+class CheckpointStore:
+    """
+    Durable record of the migration units already posted, so an interrupted run can resume where it stopped.
+
+    Units are keyed by (data element, COC filter, period window, batch hash). A whole period window is recorded
+    with the batch hash WINDOW once all of its batches are posted; pulled batches are recorded by the sha1 of
+    their rows, which does not depend on how the adaptive batcher later splits them into POSTs. The store is a
+    SQLite file and is safe to share between the pipeline workers.
+    """
+    WINDOW = '*'
+
+    def __init__(self, path='migration_checkpoint.db', log=None):
+        self.path = path
+        self.logger = log if log else logzero.logger
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS checkpoints ("
+                             "data_element TEXT NOT NULL, coc_filter TEXT NOT NULL, period_window TEXT NOT NULL, "
+                             "batch_hash TEXT NOT NULL, completed_at TEXT NOT NULL, "
+                             "PRIMARY KEY (data_element, coc_filter, period_window, batch_hash))")
+
+    @staticmethod
+    def batch_hash(df):
+        return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+    def is_done(self, data_element, coc_filter, period_window, batch_hash=WINDOW):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM checkpoints WHERE data_element = ? AND coc_filter = ? "
+                                   "AND period_window = ? AND batch_hash = ?",
+                                   (str(data_element), str(coc_filter), period_window, batch_hash)).fetchone()
+        return row is not None
+
+    def mark_done(self, data_element, coc_filter, period_window, batch_hash=WINDOW):
+        completed_at = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                             (str(data_element), str(coc_filter), period_window, batch_hash, completed_at))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class MetadataIndex:
+    """
+    name -> id index per server and metadata type (categoryCombos, dataElementGroups, dataSets, dataElements).
+
+    Each type is loaded once with a single paging=false&fields=id,name request, kept in memory and persisted to
+    'path' so later runs reuse it until it is older than 'ttl_hours'. Objects created by the Engine are added
+    under the server they were created on, so checks after a create stay O(1) without reloading the type; a type
+    that only holds added objects is not complete and never counts as loaded.
+    """
+    def __init__(self, path='metadata_index.json', ttl_hours=24, log=None):
+        self.path = path
+        self.ttl = timedelta(hours=ttl_hours)
+        self.logger = log if log else logzero.logger
+        self._lock = threading.Lock()
+        self._index = {}  # base_url -> metadata -> {"loaded_at": str, "names": {name: id}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as index_file:
+                    self._index = json.load(index_file)
+            except (IOError, OSError, ValueError) as e:
+                self.logger.debug(f"[MetadataIndex] Ignoring unreadable {path}: {e}")
+
+    def is_fresh(self, base_url, metadata):
+        with self._lock:
+            entry = self._index.get(base_url, {}).get(metadata)
+        return entry is not None and entry.get("complete", True) and self._within_ttl(entry)
+
+    def _within_ttl(self, entry):
+        loaded_at = datetime.strptime(entry["loaded_at"], '%Y-%m-%d %H:%M:%S')
+        return datetime.today() - loaded_at < self.ttl
+
+    def load(self, base_url, metadata, objects):
+        names = {}
+        for obj in objects:
+            names.setdefault(obj.get('name'), obj.get('id'))  # first object wins, as when paging through
+        with self._lock:
+            self._index.setdefault(base_url, {})[metadata] = {
+                "loaded_at": datetime.today().strftime('%Y-%m-%d %H:%M:%S'), "names": names, "complete": True}
+        self.save()
+        self.logger.debug(f"[MetadataIndex] Loaded {len(names)} {metadata}")
+
+    def get(self, base_url, metadata, name):
+        with self._lock:
+            entry = self._index.get(base_url, {}).get(metadata)
+        if entry is None or not (entry.get("complete", True) or self._within_ttl(entry)):
+            return None  # objects added to a type never loaded expire with the ttl
+        return entry["names"].get(name)
+
+    def add(self, base_url, metadata, name, uid):
+        with self._lock:
+            entry = self._index.setdefault(base_url, {}).setdefault(metadata, {
+                "loaded_at": datetime.today().strftime('%Y-%m-%d %H:%M:%S'), "names": {}, "complete": False})
+            entry["names"][name] = uid
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            try:
+                with open(f"{self.path}.tmp", 'w', encoding='utf-8') as index_file:
+                    json.dump(self._index, index_file)
+                os.replace(f"{self.path}.tmp", self.path)
+            except (IOError, OSError) as e:
+                self.logger.debug(f"[MetadataIndex] Could not save {self.path}: {e}")
+
+class AdaptiveBatcher:
+    """
+    Chooses the number of data values per dataValueSets POST from what the destination server has been doing.
+
+    After every POST, record() is given the rows sent, the response time, the payload size, the HTTP status and
+    the number of conflicts, and adjusts the batch size for the next POST:
+        - 5xx responses or timeouts halve the size, and while they make up more than 'max_error_rate' of the
+          recent POSTs the size is not grown again,
+        - conflicts halve the size so fewer values wait in the conflict queue for repair and re-post,
+        - payloads above 'max_payload_bytes' shrink the size in proportion,
+        - responses slower than 'target_seconds' shrink the size in proportion, responses faster than half of
+          it grow the size by 'growth'.
+    The size always stays between 'floor' and 'ceiling', and every change is written to the log.
+    """
+    def __init__(self, initial=500, floor=100, ceiling=5000, target_seconds=10.0, max_payload_bytes=5_000_000,
+                 growth=1.5, max_error_rate=0.2, window=20, log=None):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.size = min(max(initial, floor), ceiling)
+        self.target_seconds = target_seconds
+        self.max_payload_bytes = max_payload_bytes
+        self.growth = growth
+        self.max_error_rate = max_error_rate
+        self.outcomes = deque(maxlen=window)  # True for 5xx/timeouts over the last 'window' POSTs
+        self.logger = log if log else logzero.logger
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        with self._lock:
+            return self.size
+
+    def record(self, rows, seconds, payload_bytes, status_code=None, conflicts=0, failed=False):
+        with self._lock:
+            failed = failed or (status_code is not None and status_code >= 500)
+            self.outcomes.append(failed)
+            error_rate = sum(self.outcomes) / len(self.outcomes)
+            size = self.size
+            if failed:
+                size, reason = size // 2, "server error or timeout"
+            elif conflicts:
+                size, reason = size // 2, f"{conflicts} conflicts"
+            elif payload_bytes > self.max_payload_bytes:
+                size, reason = int(size * self.max_payload_bytes / payload_bytes), "payload too large"
+            elif seconds > self.target_seconds:
+                size, reason = int(size * self.target_seconds / seconds), "slow response"
+            elif seconds < self.target_seconds / 2 and rows >= size and error_rate <= self.max_error_rate:
+                size, reason = int(size * self.growth), "fast response"
+            else:
+                reason = "within target"
+            size = min(max(size, self.floor), self.ceiling)
+            self.logger.debug(f"[AdaptiveBatcher] {rows} rows, {payload_bytes} bytes in {seconds:.2f}s, "
+                              f"status {status_code}, conflicts {conflicts}, error rate {error_rate:.0%} "
+                              f"- batch size {self.size} -> {size} ({reason})")
+            self.size = size
+            return size
+
+class ConflictQueue:
+    """
+    Conflicts returned by dataValueSets POSTs waiting for FixErrors, with the batches that hit them.
+
+    Conflicts are deduplicated by (value, property) over the whole run, so every repair only gets the conflicts
+    it has not seen before. The errorCode is left out of the key: a conflict predicted before posting (errorCode
+    'PREDICTED') is the same conflict the server reports later under its own code. A repair is due once 'every_batches' batches are queued or
+    'every_seconds' have passed since the oldest queued entry; drain() hands over the new conflicts and the
+    batches to post again after the repair.
+    """
+    def __init__(self, every_batches=10, every_seconds=300.0, log=None):
+        self.every_batches = every_batches
+        self.every_seconds = every_seconds
+        self.seen = set()
+        self.new_conflicts = []
+        self.batches = []
+        self.oldest = None
+        self.logger = log if log else logzero.logger
+        self._lock = threading.Lock()
+
+    def add(self, conflicts, batch=None):
+        """
+        Queue the conflicts of a POST and, when given, the batch to post again after the repair.
+
+        Returns:
+            list: (value, errorCode, property) of the conflicts not seen before.
+        """
+        with self._lock:
+            new = []
+            for conflict in conflicts:
+                key = (conflict.get('value'), conflict.get('property'))
+                if key not in self.seen:
+                    self.seen.add(key)
+                    new.append((conflict.get('value'), conflict.get('errorCode'), conflict.get('property')))
+            self.new_conflicts.extend(new)
+            if batch is not None:
+                self.batches.append(batch)
+            if self.oldest is None and (self.new_conflicts or self.batches):
+                self.oldest = time.monotonic()
+            return new
+
+    def due(self):
+        with self._lock:
+            if self.oldest is None:
+                return False
+            return len(self.batches) >= self.every_batches or time.monotonic() - self.oldest >= self.every_seconds
+
+    def drain(self):
+        with self._lock:
+            conflicts, batches = self.new_conflicts, self.batches
+            self.new_conflicts, self.batches, self.oldest = [], [], None
+            self.logger.debug(f"[ConflictQueue] Drained {len(conflicts)} new conflicts and {len(batches)} batches")
+            return conflicts, batches
+
+class ConflictPredictor:
+    """
+    Predicts, before a batch is posted, the two dataValueSets conflicts FixErrors knows how to repair:
+        - the COC is not part of the category combo of the data element,
+        - the org unit is outside the org units of a category option of the attribute option combo.
+
+    The category combo -> COC assignments are loaded once; data elements, attribute option combos, category
+    options and org unit paths are fetched from the destination the first time a batch references them.
+    Anything that cannot be looked up is assumed valid, the server stays the final judge.
+    """
+    def __init__(self, engine, log=None):
+        self.engine = engine
+        self.logger = log if log else logzero.logger
+        self._lock = threading.Lock()
+        self.org_unit_paths = {}  # org unit id -> path, not changed by repairs
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget the loaded assignments, called after FixErrors changed them.
+        """
+        with self._lock:
+            self.combo_cocs = None  # categoryCombo id -> set of COC ids
+            self.de_combos = {}  # dataElement id -> categoryCombo id (None when not found)
+            self.aoc_options = {}  # attribute option combo id -> category option ids
+            self.option_org_units = {}  # category option id -> org unit ids (empty: valid everywhere)
+
+    def _load(self, df):
+        if self.combo_cocs is None:
+            combos = self.engine.get_url_data(f"{self.engine.destination_base_url}categoryCombos.json"
+                                              f"?fields=id,categoryOptionCombos[id]&paging=false",
+                                              connection="destination")
+            self.combo_cocs = {combo['id']: {coc['id'] for coc in combo.get('categoryOptionCombos', [])}
+                               for combo in combos.get('categoryCombos', [])}
+
+        new_des = [de for de in df['dataElement'].dropna().unique() if de not in self.de_combos]
+        if new_des:
+            found = self.engine.get_metadata_by_ids("dataElements", new_des, fields="id,categoryCombo[id]")
+            for de in new_des:
+                self.de_combos[de] = found[de]['categoryCombo']['id'] if de in found else None
+
+        new_aocs = [aoc for aoc in df['attributeOptionCombo'].dropna().unique() if aoc not in self.aoc_options]
+        if new_aocs:
+            found = self.engine.get_metadata_by_ids("categoryOptionCombos", new_aocs, fields="id,categoryOptions[id]")
+            for aoc in new_aocs:
+                self.aoc_options[aoc] = [option['id'] for option in found.get(aoc, {}).get('categoryOptions', [])]
+
+        new_options = list({option for aoc in new_aocs for option in self.aoc_options[aoc]
+                            if option not in self.option_org_units})
+        if new_options:
+            found = self.engine.get_metadata_by_ids("categoryOptions", new_options, fields="id,organisationUnits[id]")
+            for option in new_options:
+                self.option_org_units[option] = {ou['id'] for ou in found.get(option, {}).get('organisationUnits', [])}
+
+        new_org_units = [ou for ou in df['orgUnit'].dropna().unique() if ou not in self.org_unit_paths]
+        if new_org_units:
+            found = self.engine.get_metadata_by_ids("organisationUnits", new_org_units, fields="id,path")
+            for ou in new_org_units:
+                self.org_unit_paths[ou] = found.get(ou, {}).get('path')
+
+    def predict(self, df):
+        """
+        Check a batch of data values against the destination's metadata assignments.
+
+        Returns:
+            tuple: (boolean Series, True for the rows predicted to conflict;
+                    list of conflicts shaped like the dataValueSets import conflicts, with errorCode 'PREDICTED')
+        """
+        with self._lock:
+            self._load(df)
+            conflicts = []
+            bad_pairs = set()
+            for de, coc in df[['dataElement', 'categoryOptionCombo']].drop_duplicates().itertuples(index=False):
+                combo = self.de_combos.get(de)
+                if combo is None or combo not in self.combo_cocs or coc in self.combo_cocs[combo]:
+                    continue
+                bad_pairs.add((de, coc))
+                conflicts.append({'object': coc, 'property': 'categoryOptionCombo', 'errorCode': 'PREDICTED',
+                                  'value': f"Category option combo: `{coc}` must be part of category combo of "
+                                           f"data element: `{de}`"})
+
+            bad_org_units = set()
+            for ou, aoc in df[['orgUnit', 'attributeOptionCombo']].dropna().drop_duplicates().itertuples(index=False):
+                path = self.org_unit_paths.get(ou)
+                if not path:
+                    continue
+                # Category options assigned to an ancestor are valid for the whole subtree
+                ancestors = set(path.strip('/').split('/'))
+                for option in self.aoc_options.get(aoc, []):
+                    assigned = self.option_org_units.get(option)
+                    if assigned and not assigned & ancestors:
+                        bad_org_units.add((ou, aoc))
+                        conflicts.append({'object': ou, 'property': 'orgUnit', 'errorCode': 'PREDICTED',
+                                          'value': f"Organisation unit: `{ou}` is not valid for attribute option "
+                                                   f"combo: `{aoc}`"})
+                        break
+
+        predicted = pd.Series(False, index=df.index)
+        if bad_pairs:
+            predicted |= pd.Series([pair in bad_pairs for pair in zip(df['dataElement'], df['categoryOptionCombo'])],
+                                   index=df.index)
+        if bad_org_units:
+            predicted |= pd.Series([pair in bad_org_units for pair in zip(df['orgUnit'], df['attributeOptionCombo'])],
+                                   index=df.index)
+        return predicted, conflicts
+
 class Engine:
-    def __init__(self, connection=None, log=None, org_unit_group=None, datasource=None, posted_file_path=None, years=None):
+    # Columns kept from every dataValueSets row pulled from the source
+    DATA_VALUE_COLUMNS = ['dataElement', 'period', 'orgUnit', 'categoryOptionCombo', 'attributeOptionCombo', 'value']
+    # JSON dataValues keys mapped to the dataValueSets.csv header names they may appear under
+    # (DHIS2 writes catoptcombo/attroptcombo)
+    CSV_DATA_VALUE_COLUMNS = {'dataElement': ('dataelement',), 'period': ('period',), 'orgUnit': ('orgunit',),
+                              'categoryOptionCombo': ('catoptcombo', 'categoryoptioncombo'),
+                              'attributeOptionCombo': ('attroptcombo', 'attributeoptioncombo'),
+                              'value': ('value',)}
+    METADATA_ID_CHUNK_SIZE = 100  # ids per filter=id:in:[...] request in get_metadata_by_ids
+
+    def __init__(self, connection=None, log=None, org_unit_group=None, datasource=None, posted_file_path=None, years=None,
+                 stream_pull=True, pull_batch_size=5000, debug_snapshots=False, concurrency=None, checkpoint=None,
+                 batching=None, metadata_index=None, conflict_repair=None, preflight=True, import_mode=None,
+                 deletion=None):
         self.logger = log
         self.source_session = None
         self.destination_session = None
@@ -196,6 +661,54 @@ class Engine:
         self.process_months = years.get('process_months', None)
         self.process_days = years.get('process_days', None)
         self.error_data = []
+        self.stream_pull = stream_pull  # read dataValues incrementally instead of json.loads on the whole body
+        self.pull_batch_size = pull_batch_size  # rows handed to the filter/post stage per pulled batch
+        self.debug_snapshots = debug_snapshots  # write intermediate DataFrames to disk (Parquet, CSV fallback)
+        self.df_processing_source = None  # rows of the data element name being processed (see data_to_process)
+        # Pull/post pipeline for datavalues(); None keeps the sequential window-by-window migration
+        self.concurrency = concurrency
+        self.pull_workers = concurrency.get('pull_workers', 2) if concurrency else 1
+        self.post_workers = concurrency.get('post_workers', 2) if concurrency else 1
+        self.queue_size = concurrency.get('queue_size', 8) if concurrency else 0
+        self._lock = threading.Lock()  # guards error_data, conflict repair and the posted file across post workers
+        self.checkpoint = checkpoint  # CheckpointStore used to skip windows and batches already posted
+        self.filter_in_view = None  # COC filter of the current process_metadata call, part of the checkpoint key
+        # Batch size of the dataValueSets POSTs, adjusted from the destination's latency, errors and conflicts
+        self.batcher = AdaptiveBatcher(log=self.logger, **(batching or {}))
+        # name -> id lookups for create_check_metadata(mode='check')
+        self.metadata_index = metadata_index if metadata_index is not None else MetadataIndex(log=self.logger)
+        # Conflicts are repaired in debounced rounds (see ConflictQueue) instead of after every batch
+        self.conflict_queue = ConflictQueue(log=self.logger, **(conflict_repair or {}))
+        self._repair_lock = threading.Lock()
+        # Checkpoint units (data element, COC filter, window, batch hash) with batches waiting in the conflict
+        # queue; a unit, and its window, is only recorded once those batches are re-posted (see settle_unit)
+        self._pending_units = {}
+        self._awaiting_windows = set()
+        self._failed_windows = set()
+        self._units_lock = threading.Lock()
+        # Values predicted to conflict are routed to repair before they are posted
+        self.predictor = ConflictPredictor(self, log=self.logger) if preflight else None
+        # dataValueSets import: synchronous by default, or async jobs polled on system/tasks while the next
+        # batches are prepared, at most 'max_in_flight' jobs at a time; 'dry_run' only validates the values
+        import_mode = import_mode or {}
+        self.async_import = import_mode.get('async', False)
+        self.dry_run = import_mode.get('dry_run', False)
+        self.poll_interval = import_mode.get('poll_interval', 5)
+        self.job_timeout = import_mode.get('job_timeout', 3600)
+        self.post_timeout = import_mode.get('post_timeout', 600)  # seconds, for every POST made by post_data
+        max_in_flight = import_mode.get('max_in_flight', 4)
+        self._import_slots = threading.BoundedSemaphore(max_in_flight)
+        self._import_pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="import-job") \
+            if self.async_import else None
+        # delete_datavalues: rows per DELETE post, posts at a time, and whether to only count the values
+        deletion = deletion or {}
+        self.delete_batch_size = deletion.get('batch_size', 5000)
+        self.delete_workers = deletion.get('workers', 4)
+        self.delete_count_only = deletion.get('count_only', False)
+        if self.dry_run and checkpoint is not None:
+            # Nothing is imported in a dry run, so nothing may be recorded as migrated
+            self.logger.debug("Dry run: checkpoint store disabled")
+            self.checkpoint = None
         self.months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12'] #['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
         self.ping_connections()
 
@@ -224,6 +737,7 @@ class Engine:
                          process_data_values_=True):
         self.new_data_element = new_data_element
         self.data_element_in_view = data_element_in_view
+        self.filter_in_view = filter_item if update_specific_coc_ is None else update_specific_coc_
         self.process_category_combination_maintenance = process_category_combination_maintenance_
         if self.config_metadata is not data_element_in_view:
             self.create_update_data_element_group(mode='update')
@@ -248,14 +762,11 @@ class Engine:
 
         if self.data_to_process_df is not None:
             if self.process_category_combination_maintenance:
-                with pd.ExcelWriter("filter_xls.xlsx") as writer:
-                    self.data_to_process_df.to_excel(writer, sheet_name='data_elements', index=False)
                 try:
-                    # Loop through each row in the DataFrame along with the index
-                    self.data_to_process_df = pd.read_excel("filter_xls.xlsx", sheet_name=0)
+                    # Positional index, rows are looked up by process_index below
+                    self.data_to_process_df = self.data_to_process_df.reset_index(drop=True)
                     self.logger.debug(f'self.data_to_process_df length: {len(self.data_to_process_df)} for {filter_item} in {self.data_element_in_view}')
-                    # Convert the filtered data to a CSV file and name it 'filter_csv.csv'
-                    self.data_to_process_df.to_csv('filter_csv.csv', index=False)
+                    self.snapshot(self.data_to_process_df, 'filter_csv')
                     if update_specific_coc_ is None:
                         # get old categoryCombos CoCs
                         cc_data_update_ = self.get_url_data(f"{self.source_base_url}categoryCombos/{old_cc_id}.json?"
@@ -278,7 +789,7 @@ class Engine:
                         data_structured_ = {"categoryCombos": [cc_data],
                                             "categoryOptionCombos": cc_data_update_["categoryOptionCombos"]}
                         # data_structured_ = {"categoryOptionCombos": coc_data_update["categoryOptionCombos"]}
-                        data_ = Engine.clean_up(str(data_structured_))
+                        data_ = Engine.serialize(data_structured_)
                         response_update_ = self.post_data(url=f"{self.destination_base_url}metadata", data=data_,
                                                         params={'importStrategy': 'CREATE_AND_UPDATE'})
                         self.logger.debug('++ Pushing categoryCombos and categoryOptionCombos data ++')
@@ -290,6 +801,10 @@ class Engine:
                         co_data['displayName'] = new_name
                         # Loop through DataFrame rows once and update accordingly
                         update_co_with_categories_counter = 0
+                        # Fetch every row's COC up front, in parallel, instead of one GET per row in the loop
+                        prefetched_cocs = self.get_many_url_data(
+                            [f"{self.source_base_url}categoryOptionCombos/{uid}.json"
+                             for uid in self.data_to_process_df['categoryOptionCombos.id']], connection="source")
                         for process_index in range(len(self.data_to_process_df)):
                             # self.logger.debug(self.data_to_process_df['categoryOptionCombos.id'].iloc[index])
                             self.logger.debug(f"grouped data for {data_element_in_view} - index value for row : {process_index}/{len(self.data_to_process_df)}")
@@ -297,11 +812,13 @@ class Engine:
 
                                 co_data['categories'] = self.update_co_categories(process_index)
                                 co_data_structured = {"categoryCombos": [co_data],
-                                                      "categoryOptionCombos": [self.update_coc_category(co_id, process_index)]}
+                                                      "categoryOptionCombos": [self.update_coc_category(
+                                                          co_id, process_index, prefetched_cocs[process_index])]}
                                 # Increment the counter after updating the categories
                                 update_co_with_categories_counter += 1
                             else:
-                                co_data_structured = {"categoryOptionCombos": [self.update_coc_category(co_id, process_index)]}
+                                co_data_structured = {"categoryOptionCombos": [self.update_coc_category(
+                                    co_id, process_index, prefetched_cocs[process_index])]}
                             # with open('co_coc_data.json', 'w') as json_file:
                             #     json.dump(co_data_structured, json_file)
                             #
@@ -316,32 +833,41 @@ class Engine:
             if process_data_values_:
                 self.datavalues()
 
+    def use_checked_metadata(self, metadata, target_name, uid):
+        if metadata == 'dataElementGroups':
+            self.data_element_group_id = uid
+        if metadata == 'dataSets':
+            self.migration_dataset_id = uid
+        if metadata == 'dataElements':
+            self.new_data_element = uid
+        self.logger.debug(f"CO == > {{'name': {target_name!r}, 'id': {uid!r}}}")
+        return uid
+
     def create_check_metadata(self, metadata, mode, target_name, json_obj):
         metadata_data = None
         if mode == 'check':
-            check_exist_json = f"{self.source_base_url}{metadata}.json?fields=id%2Cname"
-            self.logger.debug(check_exist_json)
-            check_exist_json_data = self.get_url_data(check_exist_json, connection="source")
-            page_count = check_exist_json_data['pager'].get('pageCount')
-            for page in range(1, int(page_count) + 1):
-                # Construct the URL for the current page
-                page_url = f"{self.source_base_url}{metadata}.json?fields=id%2Cname&page={page}"
-                check_exist_json_data = self.get_url_data(page_url, connection="source")
-                # Extract categoryCombos from the current page
-                obj = check_exist_json_data.get(f'{metadata}', [])
-                # Loop through categoryCombos and check for target name
-                for values in obj:
-                    if values.get('name') == target_name:
-                        # self.logger.debug(f'{metadata} exists')
-                        if metadata == 'dataElementGroups':
-                            self.data_element_group_id = values.get('id')
-                        if metadata == 'dataSets':
-                            self.migration_dataset_id = values.get('id')
-                        if metadata == 'dataElements':
-                            self.new_data_element = values.get('id')
-                        self.logger.debug(f"CO == > {values}")
-                        return values.get('id')
-            return None
+            if self.destination_base_url != self.source_base_url:
+                # Created by an earlier call on the destination
+                uid = self.metadata_index.get(self.destination_base_url, metadata, target_name)
+                if uid is not None:
+                    return self.use_checked_metadata(metadata, target_name, uid)
+            if not self.metadata_index.is_fresh(self.source_base_url, metadata):
+                check_exist_json = f"{self.source_base_url}{metadata}.json?fields=id%2Cname&paging=false"
+                self.logger.debug(check_exist_json)
+                check_exist_json_data = self.get_url_data(check_exist_json, connection="source")
+                if metadata in check_exist_json_data:
+                    self.metadata_index.load(self.source_base_url, metadata, check_exist_json_data[metadata])
+            if self.metadata_index.is_fresh(self.source_base_url, metadata):
+                uid = self.metadata_index.get(self.source_base_url, metadata, target_name)
+            else:
+                # The full list could not be loaded, ask the server for this one name
+                name_json = f"{self.source_base_url}{metadata}.json?fields=id%2Cname" \
+                            f"&filter=name:eq:{quote(str(target_name), safe='')}&paging=false"
+                matches = self.get_url_data(name_json, connection="source").get(metadata, [])
+                uid = matches[0].get('id') if matches else None
+            if uid is not None:
+                self.use_checked_metadata(metadata, target_name, uid)
+            return uid
         if mode == 'create':
             uid = self.get_uid(self.destination_base_url)
             if metadata == 'categoryCombos':
@@ -429,7 +955,7 @@ class Engine:
                 }
                 self.new_data_element = uid
             data_structured_ = {f"{metadata}": [metadata_data]}
-            data__ = Engine.clean_up(str(data_structured_))
+            data__ = Engine.serialize(data_structured_)
             # self.logger.debug("data_structured: ", data__)
             params = {'importStrategy': 'CREATE_UPDATE'}
             response_update_ = self.post_data(url=f"{self.destination_base_url}metadata", data=data__, params=params)
@@ -455,6 +981,7 @@ class Engine:
                     self.create_check_metadata(metadata, mode, target_name, json_obj)
             elif ignored_value == 0:
                 self.logger.debug("response_data %s", json.dumps(response_data))
+                self.metadata_index.add(self.destination_base_url, metadata, metadata_data.get('name', target_name), uid)
                 return uid
             else:
                 return None
@@ -510,13 +1037,14 @@ class Engine:
             self.logger.debug(f"Error updating categories at index {processed_index}: {e}")
             return cat
 
-    def update_coc_category(self, co_id, processed_index):
+    def update_coc_category(self, co_id, processed_index, coc_data_=None):
         """
         This function updates the categoryOptionCombo (COC) category for a specific record in a DataFrame.
 
         Args:
             co_id (str): The ID of the categoryOptionCombo to be updated.
             processed_index (int): The index of the row in 'self.data_to_process_df' from which data will be extracted.
+            coc_data_ (dict): The categoryOptionCombo when it was already fetched (see get_many_url_data).
 
         Workflow:
             1. Defines the column(s) ('categoryOptionCombos.id') from which the UID (unique identifier) will be extracted.
@@ -541,7 +1069,8 @@ class Engine:
             uid = self.data_to_process_df.loc[processed_index, col]  # Access the value in the first row
             if pd.notna(uid):  # Check if the value is not NaN
                 cat_option_combo.append({"id": co_id})
-        coc_data_ = self.get_url_data(f"{self.source_base_url}categoryOptionCombos/{uid}.json", connection="source")
+        if coc_data_ is None:
+            coc_data_ = self.get_url_data(f"{self.source_base_url}categoryOptionCombos/{uid}.json", connection="source")
         coc_data_["categoryCombo"] = cat_option_combo[0]
         return coc_data_  # Optionally, return the 'cat' list if needed elsewhere
 
@@ -569,6 +1098,8 @@ class Engine:
             session = self.destination_session if connection == "destination" else self.source_session
         try:
             response = session.get(url, timeout=self.timeout)
+            if not response.ok:
+                self.logger.debug(f"GET {url} returned {response.status_code} after retries")
             get_data_ = json.loads(response.text)
             return get_data_
         except json.JSONDecodeError as e:
@@ -583,12 +1114,53 @@ class Engine:
             self.logger.debug(f"Unexpected error at {failure_today_date_time}: {e}")
             return {}  # Return empty dictionary instead of None
 
+    def get_many_url_data(self, urls, connection="source"):
+        """
+        GET many urls against the same host in parallel and return their parsed JSON in the order of 'urls'.
+
+        Uses the asyncio transport when httpx is installed, otherwise a thread pool over the pooled session.
+        Like get_url_data, a url that cannot be fetched or parsed gives an empty dictionary.
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        session = self.destination_session if connection == "destination" else self.source_session
+        transport = self.connection.transport
+        if httpx is not None:
+            try:
+                return transport.get_many(urls, session.auth, self.timeout)
+            except Exception as e:
+                self.logger.debug(f"Async GETs failed, falling back to threads: {e}")
+        with ThreadPoolExecutor(max_workers=transport.pool_size) as pool:
+            return list(pool.map(lambda url: self.get_url_data(url, connection=connection), urls))
+
+    def get_metadata_by_ids(self, metadata, ids, fields=":owner", connection="destination"):
+        """
+        GET the metadata objects with the given ids, METADATA_ID_CHUNK_SIZE ids per filter=id:in:[...] request.
+
+        Returns:
+            dict: id -> object, ids that do not exist on the server are missing.
+        """
+        base_url = self.destination_base_url if connection == "destination" else self.source_base_url
+        ids = list(dict.fromkeys(ids))
+        chunk = Engine.METADATA_ID_CHUNK_SIZE
+        urls = [f"{base_url}{metadata}.json?filter=id:in:[{','.join(ids[i:i + chunk])}]"
+                f"&fields={fields}&paging=false" for i in range(0, len(ids), chunk)]
+        objects = {}
+        for data_ in self.get_many_url_data(urls, connection=connection):
+            for obj in data_.get(metadata, []):
+                objects[obj['id']] = obj
+        self.logger.debug(f"Fetched {len(objects)} of {len(ids)} {metadata} from {connection}")
+        return objects
+
     def post_data(self, url=None, json_=None, data=None, params=None,
-                                                headers={"Content-Type": "application/json; charset=utf-8"}, connection="destination", data_structured_=None):
+                                                headers={"Content-Type": "application/json; charset=utf-8"}, connection="destination", data_structured_=None,
+                  timeout=None):
 
         # Ensure the URL is provided
         if url is None:
             raise ValueError("The 'url' parameter must be provided.")
+        timeout = timeout if timeout is not None else self.post_timeout
 
         # Select the appropriate session based on destination
         session = self.destination_session if connection == "destination" else self.source_session
@@ -597,12 +1169,15 @@ class Engine:
         if data is not None:
             try:
                 response_update_ = session.post(url=url, data=data, params=params,
-                                                headers=headers)
+                                                headers=headers, timeout=timeout)
             except Exception as e:
-                response_update_ = session.post(url=url, json=data_structured_, params=params, headers=headers)
+                if data_structured_ is None:
+                    raise
+                response_update_ = session.post(url=url, json=data_structured_, params=params, headers=headers,
+                                                timeout=timeout)
 
         elif json_ is not None:
-            response_update_ = session.post(url=url, json=json_, params=params, headers=headers)
+            response_update_ = session.post(url=url, json=json_, params=params, headers=headers, timeout=timeout)
         else:
             raise ValueError("Either 'data' or 'json' must be provided.")
 
@@ -616,9 +1191,9 @@ class Engine:
     def data_to_process(self, filter_option1, data_element_in_view=None):
         filtered_results = None
         if data_element_in_view is not None:
-            self.df = pd.read_excel("processing_source_engine.xlsx", sheet_name=0)
+            self.df = self.df_processing_source
             filtered_data = self.df[self.df['dataElement.id'] == data_element_in_view]
-            filtered_data.to_csv('before_filter.csv', index=False)
+            self.snapshot(filtered_data, 'before_filter')
             self.logger.debug(f"{self.min_unique_column_to_filter} - column filter enabled")
             if isinstance(filter_option1, list):
                 # If filter_option1 is a list, use isin()
@@ -631,13 +1206,25 @@ class Engine:
                     ]
         if data_element_in_view is None:
             filtered_results = self.df_main[self.df_main['Proposed new Data element Name'] == filter_option1]
-            with pd.ExcelWriter("processing_source_engine.xlsx") as writer:
-                filtered_results.to_excel(writer, sheet_name='data_elements', index=False)
+            self.df_processing_source = filtered_results.reset_index(drop=True)
+            self.snapshot(self.df_processing_source, 'processing_source_engine')
         if len(filtered_results) > 0:
             return filtered_results
         else:
             return None
 
+    def snapshot(self, df, name):
+        """
+        Write a debug snapshot of an intermediate DataFrame when 'self.debug_snapshots' is enabled.
+        Parquet is used when a parquet engine is installed, CSV otherwise.
+        """
+        if not self.debug_snapshots or df is None:
+            return
+        try:
+            df.to_parquet(f"{name}.parquet", index=False)
+        except Exception:
+            df.to_csv(f"{name}.csv", index=False)
+
     def set_filter_column(self, min_unique_column_to_filter):
         self.min_unique_column_to_filter = min_unique_column_to_filter
 
@@ -660,8 +1247,8 @@ class Engine:
                                     }
                 data_element_group_json_data["dataElements"].append(new_element_id)
             data_structured_ = {"dataElementGroups": [data_element_group_json_data]}
-            data_ = Engine.clean_up(str(data_structured_))
-            self.logger.debug(data_)
+            data_ = Engine.serialize(data_structured_)
+            self.logger.debug(data_.decode('utf-8'))
             params = {'importStrategy': 'UPDATE'}
             response_update_ = self.post_data(url=f"{self.destination_base_url}metadata", data=data_, params=params)
             self.logger.debug('++ Updating DataElementGroups ++ ')
@@ -669,7 +1256,7 @@ class Engine:
             self.logger.debug("response %s", json.dumps(response_update_.text))
             if response_update_.status_code == 500:
                 self.logger.debug("failed to update DataElementGroups")
-                self.logger.debug(data)
+                self.logger.debug(data_.decode('utf-8'))
                 sys.exit()
 
     def update_dataset(self, data_element_in_view):
@@ -712,7 +1299,7 @@ class Engine:
         del dataset_json_data["user"], dataset_json_data["created"]
         del dataset_json_data["lastUpdated"]
         data_structured_ = {"dataSets": [dataset_json_data]}
-        data_ = Engine.clean_up(str(data_structured_))
+        data_ = Engine.serialize(data_structured_)
         params = {'importStrategy': 'UPDATE'}
         response_update_ = self.post_data(url=f"{self.destination_base_url}metadata", data=data_, params=params)
         self.logger.debug('++ Updating Datasets ++')
@@ -722,8 +1309,8 @@ class Engine:
             self.logger.debug("failed to update datasets")
             del dataset_json_data['organisationUnits']
             data_structured_ = {"dataSets": [dataset_json_data]}
-            data_ = Engine.clean_up(str(data_structured_))
-            self.logger.debug(data_)
+            data_ = Engine.serialize(data_structured_)
+            self.logger.debug(data_.decode('utf-8'))
             sys.exit()
 
     @staticmethod
@@ -742,30 +1329,43 @@ class Engine:
     def datavalues(self):
         # Get the unique values in the 'category Option 5' column
         filtered_data_category_option_combos = self.data_to_process_df['categoryOptionCombos.id'].unique()
+        windows = list(self.period_windows())
+        if self.concurrency:
+            self.run_pipeline(windows, filtered_data_category_option_combos)
+        else:
+            for start_date, end_date, data_value_url in windows:
+                self.post_values(start_date, end_date, filtered_data_category_option_combos, data_value_url)
+        # Repair what is still queued and post the affected batches again
+        self.repair_conflicts(force=True)
+
+    def build_data_value_url(self, start_date, end_date):
+        return f"{self.source_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
+               f"&startDate={start_date}&endDate={end_date}" \
+               f"&dataElementGroup={self.data_element_group_id}" \
+               f"&orgUnitGroup={self.org_unit_group}"
+
+    def period_windows(self):
+        """
+        Generate the period windows to migrate, following the year/month/3-day settings in 'years'.
+
+        Yields:
+            tuple: (start_date, end_date, data_value_url) as handed to post_values.
+        """
         today_date = datetime.today().strftime('%Y-%m-%d')
         for year in self.generate_years():
-            # self.logger.debug('filtered_data_category_option_combos: ', filtered_data_category_option_combos)
-            # data_value_url = None
-            # end_year = None
             if self.specific_years is not None:
                 end_year = int(year)
                 if self.process_months is None:
-                    data_value_url = f"{self.source_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
-                                     f"&startDate={year}-01-01&endDate={end_year}-12-31" \
-                                     f"&dataElementGroup={self.data_element_group_id}" \
-                                     f"&orgUnitGroup={self.org_unit_group}"
+                    data_value_url = self.build_data_value_url(f"{year}-01-01", f"{end_year}-12-31")
                     self.logger.debug(f"{today_date} -startDate={year}-01-01&endDate={end_year}-12-31 - -- {data_value_url}")
-                    self.post_values(year, end_year, filtered_data_category_option_combos, data_value_url)
+                    yield year, end_year, data_value_url
                 else:
                     for mth in self.months:
                         if self.process_days is None:
-                            data_value_url = f"{self.source_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
-                                             f"&startDate={year}-{mth}-01" \
-                                             f"&endDate={end_year}-{mth}-{self.mth_end(mth, year)}" \
-                                             f"&dataElementGroup={self.data_element_group_id}" \
-                                             f"&orgUnitGroup={self.org_unit_group}"
+                            data_value_url = self.build_data_value_url(f"{year}-{mth}-01",
+                                                                       f"{end_year}-{mth}-{self.mth_end(mth, year)}")
                             self.logger.debug(f"{today_date} -- {data_value_url}")
-                            self.post_values(year, end_year, filtered_data_category_option_combos, data_value_url)
+                            yield year, end_year, data_value_url
                         else:
                             delta = timedelta(days=3)
                             batch_start_datetime_object = datetime.strptime(f"{year}-{mth}-01", '%Y-%m-%d')
@@ -775,170 +1375,593 @@ class Engine:
                                 potential_end_date = batch_start_datetime_object + delta
                                 new_batch_end_datetime_object = min(potential_end_date, batch_end_datetime_object)
 
-                                data_value_url = f"{self.source_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
-                                                 f"&startDate={batch_start_datetime_object.strftime('%Y-%m-%d')}" \
-                                                 f"&endDate={new_batch_end_datetime_object.strftime('%Y-%m-%d')}" \
-                                                 f"&dataElementGroup={self.data_element_group_id}" \
-                                                 f"&orgUnitGroup={self.org_unit_group}"
+                                data_value_url = self.build_data_value_url(
+                                    batch_start_datetime_object.strftime('%Y-%m-%d'),
+                                    new_batch_end_datetime_object.strftime('%Y-%m-%d'))
                                 self.logger.debug(f"{today_date} -- {data_value_url}")
-                                self.post_values(year, end_year, filtered_data_category_option_combos, data_value_url)
+                                yield year, end_year, data_value_url
                                 batch_start_datetime_object += delta
             else:
                 end_year = int(year) + 3
                 if self.process_months is not None:
-                    data_value_url = f"{self.source_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
-                                     f"&startDate={year}-01-01&endDate={end_year}-12-31" \
-                                     f"&dataElementGroup={self.data_element_group_id}" \
-                                     f"&orgUnitGroup={self.org_unit_group}"
+                    data_value_url = self.build_data_value_url(f"{year}-01-01", f"{end_year}-12-31")
                     self.logger.debug(f"{today_date} -- {data_value_url}")
-                    self.post_values(f"{year}-01-01", f"{year}-12-31", filtered_data_category_option_combos,
-                                     data_value_url)
+                    yield f"{year}-01-01", f"{year}-12-31", data_value_url
 
     def post_values(self, start_date, end_date, filtered_data_category_option_combos, data_value_url):
-        _df = None
-        data_to_get = None
+        window = Engine.window_key(data_value_url)
+        if self.window_done(window):
+            return True
+        pulled = 0
+        posted = True
         try:
-            response = self.source_session.get(data_value_url, timeout=600)
-            data_to_get = json.loads(response.text)
-            response.close()
+            for df0_filtered in self.pull_filtered_values(filtered_data_category_option_combos, data_value_url):
+                pulled += len(df0_filtered)
+                posted = self.push_values(df0_filtered, start_date, end_date, window) and posted
+                del df0_filtered
             self.logger.debug(f"Data pull completed... for &startDate={start_date}&endDate={end_date}")
         except Exception as ex:
             self.logger.debug(f"[{self.klass}] - {ex}")
-        if data_to_get is not None:
-            if 'dataValues' in data_to_get:
-                _df = pd.json_normalize(data_to_get)
-                self.logger.debug(f"normalized data been processed... ")
         else:
-            self.logger.debug(f"Error getting response data.")
-
-        if _df is not None:
-            if not _df.empty:
-                try:  ## implemented the exception to catch empty requests
-                    self.logger.debug(f"dataValues pulled - {len(_df['dataValues'][0])}")
-                    if len(_df['dataValues'][0]) > 0:
-                        # self.logger.debug("************ *************** *************")
-                        # self.logger.debug(_df['dataValues'][0])
-                        # self.logger.debug("************ *************** *************")
-                        df0 = pd.DataFrame(_df['dataValues'][0])
-                        ## deleter
-                        # del df0['value']
-                        # df0['value'] = ""
-
-                        df0 = df0[
-                            ['dataElement', 'period', 'orgUnit', 'categoryOptionCombo', 'attributeOptionCombo',
-                             'value']]
-                        self.logger.debug("*** Implementing filtered_data_category_option_combos filter ***")
-                        df0_filtered = df0[
-                            df0['categoryOptionCombo'].isin(filtered_data_category_option_combos)]
-                        # new data element uid
-                        df0_filtered = df0_filtered.copy()
-                        df0_filtered.loc[:, 'dataElement'] = self.new_data_element
-                        df0_filtered.to_csv('after_filter.csv', index=False)
-                        with pd.ExcelWriter("after_filter.xlsx") as writer:
-                            df0_filtered.to_excel(writer, sheet_name='data_elements', index=False)
-                        after_filter_df = pd.read_excel("after_filter.xlsx", sheet_name=0)
-                        self.logger.debug("*** after_filter.xlsx file for last post created ***")
-                        # Batch size
-                        batch_size = 500
-
-                        # Split the DataFrame into chunks of 1000 rows each
-                        retries_message = "Normal Post"
-                        df_batches = np.array_split(after_filter_df, len(after_filter_df) // batch_size + 1)
-                        for i, df_batch in enumerate(df_batches):
-                            self.logger.debug(f"*** Processing batch {i + 1} of {len(df_batches)} ***")
-                            self.logger.debug(df_batch.head())  # Check the structure of the first few rows
-                            with pd.ExcelWriter("filter_df_batch.xlsx") as writer:
-                                df_batch.to_excel(writer, sheet_name='data_elements', index=False)
-                            filter_df_batch = pd.read_excel("filter_df_batch.xlsx", sheet_name=0)
-                            # Check for missing data in this batch
-                            missing_data = df_batch[
-                                df_batch[
-                                    ["dataElement", "period", "orgUnit", "categoryOptionCombo", "value"]].isnull().any(
-                                    axis=1)
-                            ]
-
-                            if not missing_data.empty:
-                                self.logger.debug(f"Batch {i + 1} contains rows with missing data:")
-                                continue  # Skip the batch or handle it accordingly
-                            # Convert the current batch to JSON
-                            converted_to_json = self.DataValueProcessing.get_datavalue(filter_df_batch)
-
-                            # Function to post data with retry logic
-                            def push_data(max_retries=2):
-                                for attempt in range(1, max_retries + 1):
-                                    self.logger.debug(f"Attempt {attempt} of {max_retries} to post data.")
-
-                                    get_data_value = {"dataValues": converted_to_json}
-                                    data__ = Engine.clean_up(str(get_data_value))
-                                    self.logger.debug("*** Data cleaned ***")
-
-                                    # Post data
-                                    r = self.post_data(url=f"{self.destination_base_url}dataValueSets", data=data__)
-                                    d = r.json()
-                                    conflicts = d.get('conflicts', [])
-
-                                    # If conflicts are found, handle and retry
-                                    if conflicts:
-                                        for conflict in conflicts:
-                                            start_date_ = start_date
-                                            end_date_ = end_date
-                                            value = conflict.get('value')
-                                            error_code = conflict.get('errorCode')
-                                            prop = conflict.get('property')
-
-                                            self.logger.debug(f"Value: {value}")
-                                            self.logger.debug(f"Error Code: {error_code}")
-                                            self.logger.debug(f"Property: {prop}")
-                                            self.logger.debug("---")
-
-                                            self.error_data.append([
-                                                self.data_element_in_view, start_date_, end_date_, value, error_code,
-                                                prop
-                                            ])
-
-                                        self.error_data_saving()
-                                        fix_errors__ = FixErrors(engine_class=self)
-                                        fix_errors__.extract_metadata(triggered='Automatically')
-                                    else:
-                                        # If no conflicts, log and return
-                                        log_message = f"Data posted successfully for batch {i + 1}"
-                                        self.logger.debug(log_message)
-                                        with open(self.posted_file_path, 'a') as file:
-                                            file.write(log_message + "\n")
-                                        r.close()
-                                        del d, r, get_data_value
-                                        return True  # Success
-
-                                    r.close()
-                                    del d, r, get_data_value
-                                self.logger.debug(
-                                    f"Max retries reached for batch {i + 1}. Conflicts remain unresolved.")
-                                return False  # Failure after retries
-                            push_data()
-                        del df0, _df, df0_filtered
+            if posted:
+                self.complete_window(window)
+        if pulled == 0:
+            self.logger.debug(f" _df is empty")
+        return True
 
-                    else:
-                        self.logger.debug(f"_df is empty (1)")
-                        return True
-                except Exception as e:
-                    self.logger.debug(f"_df is empty (2) {e}")
-                    return True
-            else:
-                self.logger.debug(f"_df is empty (3)")
-                return True
+    @staticmethod
+    def window_key(data_value_url):
+        # The period window of a dataValueSets url, e.g. '2024-01-01/2024-01-31'
+        match = re.search(r"startDate=([^&]+)&endDate=([^&]+)", data_value_url)
+        return f"{match.group(1)}/{match.group(2)}" if match else data_value_url
+
+    def window_done(self, window):
+        if self.checkpoint is None:
+            return False
+        if self.checkpoint.is_done(self.data_element_in_view, self.filter_in_view, window):
+            self.logger.debug(f"Skipping {window} for {self.data_element_in_view} - {self.filter_in_view}, already migrated")
+            return True
+        return False
+
+    def complete_window(self, window):
+        if self.checkpoint is None:
+            return
+        key = (self.data_element_in_view, self.filter_in_view, window)
+        with self._units_lock:
+            if key in self._failed_windows:
+                return
+            if any(unit[:3] == key for unit in self._pending_units):
+                # Recorded by settle_unit once the batches queued for repair are re-posted
+                self._awaiting_windows.add(key)
+                return
+        self.checkpoint.mark_done(*key)
+
+    def defer_unit(self, unit):
+        # A batch of 'unit' was queued for repair and re-post
+        if unit is None:
+            return
+        with self._units_lock:
+            state = self._pending_units.setdefault(unit, {'pending': 0, 'settled': False, 'failed': False})
+            state['pending'] += 1
+
+    def settle_unit(self, unit, posted=None, reposted=None):
+        """
+        Record the outcome of a checkpoint unit: 'posted' once push_values is done with it, 'reposted' for each
+        of its batches re-posted after a repair. The unit is marked done in the checkpoint store when it was
+        posted and all of its queued batches were re-posted successfully, and its window too when the window
+        was completed in the meantime. A failed re-post leaves both unmarked.
+        """
+        if unit is None or self.checkpoint is None:
+            return
+        window_key = unit[:3]
+        with self._units_lock:
+            state = self._pending_units.get(unit)
+            if state is None:
+                if posted:
+                    self.checkpoint.mark_done(*unit)
+                return
+            if posted is not None:
+                state['settled'] = True
+                state['failed'] = state['failed'] or not posted
+            if reposted is not None:
+                state['pending'] -= 1
+                state['failed'] = state['failed'] or not reposted
+            if state['pending'] > 0 or not state['settled']:
+                return
+            del self._pending_units[unit]
+            if state['failed']:
+                self._failed_windows.add(window_key)
+                self._awaiting_windows.discard(window_key)
+                return
+            self.checkpoint.mark_done(*unit)
+            window_done = window_key in self._awaiting_windows and \
+                not any(other[:3] == window_key for other in self._pending_units)
+            if window_done:
+                self._awaiting_windows.discard(window_key)
+        if window_done:
+            self.checkpoint.mark_done(*window_key)
+
+    def pull_filtered_values(self, filtered_data_category_option_combos, data_value_url):
+        """
+        Pull a period window and yield the batches that belong to the COCs being migrated, with the
+        dataElement already switched to the new data element uid.
+        """
+        pulled = 0
+        for df0 in self.pull_datavalues(data_value_url):
+            pulled += len(df0)
+            self.logger.debug(f"dataValues pulled - {pulled}")
+            self.logger.debug("*** Implementing filtered_data_category_option_combos filter ***")
+            df0_filtered = df0[df0['categoryOptionCombo'].isin(filtered_data_category_option_combos)]
+            if df0_filtered.empty:
+                continue
+            # new data element uid
+            df0_filtered = df0_filtered.copy()
+            df0_filtered.loc[:, 'dataElement'] = self.new_data_element
+            yield df0_filtered
+
+    def run_pipeline(self, windows, filtered_data_category_option_combos):
+        """
+        Migrate period windows with a producer/consumer pipeline.
+
+        'pull_workers' threads pull windows from the source and put filtered batches on a queue bounded by
+        'queue_size', while 'post_workers' threads take batches off the queue and post them to the destination.
+        A full queue blocks the pullers (backpressure), so memory stays bounded and the total time is set by
+        the slower of the two servers instead of their sum.
+
+        Args:
+            windows (list): (start_date, end_date, data_value_url) tuples from period_windows.
+            filtered_data_category_option_combos (array): COC uids to migrate.
+        """
+        batches = queue.Queue(maxsize=self.queue_size)
+        finished = object()
+        self.logger.debug(f"Pipeline started for {len(windows)} windows - pull workers: {self.pull_workers}, "
+                          f"post workers: {self.post_workers}, queue size: {self.queue_size}")
+
+        progress_lock = threading.Lock()
+
+        def settle(window, state):
+            # A window is complete once it is fully pulled and every queued batch was posted without failures
+            if state['pulled'] and state['settled'] == state['queued'] and state['ok']:
+                self.complete_window(window)
+
+        def pull(start_date, end_date, data_value_url):
+            window = Engine.window_key(data_value_url)
+            if self.window_done(window):
+                return
+            state = {'queued': 0, 'settled': 0, 'ok': True, 'pulled': False}
+            for df0_filtered in self.pull_filtered_values(filtered_data_category_option_combos, data_value_url):
+                with progress_lock:
+                    state['queued'] += 1
+                batches.put((df0_filtered, start_date, end_date, window, state))  # blocks while the posters catch up
+            self.logger.debug(f"Data pull completed... for &startDate={start_date}&endDate={end_date}")
+            with progress_lock:
+                state['pulled'] = True
+                settle(window, state)
+
+        def post():
+            while True:
+                item = batches.get()
+                try:
+                    if item is finished:
+                        return
+                    df0_filtered, start_date, end_date, window, state = item
+                    posted = False
+                    try:
+                        posted = self.push_values(df0_filtered, start_date, end_date, window)
+                    finally:
+                        with progress_lock:
+                            state['settled'] += 1
+                            state['ok'] = state['ok'] and bool(posted)
+                            settle(window, state)
+                except Exception as ex:
+                    self.logger.debug(f"[{self.klass}] post worker - {ex}")
+                finally:
+                    batches.task_done()
+
+        posters = [threading.Thread(target=post, name=f"post-worker-{n}", daemon=True)
+                   for n in range(self.post_workers)]
+        for poster in posters:
+            poster.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.pull_workers, thread_name_prefix="pull-worker") as pool:
+                futures = {pool.submit(pull, *window): window for window in windows}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as ex:
+                        self.logger.debug(f"[{self.klass}] pull failed for {futures[future][2]} - {ex}")
+        finally:
+            for _ in posters:
+                batches.put(finished)
+            for poster in posters:
+                poster.join()
+        self.logger.debug("Pipeline finished")
+
+    def pull_datavalues(self, data_value_url, session=None, batch_size=None):
+        """
+        Pull dataValues from a dataValueSets url and yield them as DataFrames of at most 'batch_size' rows.
+
+        With 'self.stream_pull' enabled the response body is never held in memory as a whole: dataValues are read
+        incrementally through ijson when it is installed, otherwise the same query is made against the
+        dataValueSets.csv (gzip-encoded on the wire) format and parsed line by line. Peak memory is bounded by the
+        batch size rather than by the size of the period window. With 'self.stream_pull' disabled the body is
+        loaded with json.loads as before and cut into batches of the same size.
+
+        Args:
+            data_value_url (str): dataValueSets url including the period, dataset and group filters.
+            session (requests.Session): Session to pull with, defaults to the source session.
+            batch_size (int): Maximum rows per yielded DataFrame, defaults to 'self.pull_batch_size'.
+
+        Yields:
+            pd.DataFrame: Batches with the columns in 'Engine.DATA_VALUE_COLUMNS'.
+        """
+        session = session if session is not None else self.source_session
+        batch_size = batch_size or self.pull_batch_size
+        if not self.stream_pull:
+            rows = self._iter_loaded_datavalues(session, data_value_url)
+        elif ijson is not None:
+            rows = self._iter_json_datavalues(session, data_value_url)
         else:
-            self.logger.debug(f" _df is empty")
+            rows = self._iter_csv_datavalues(session, data_value_url)
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=Engine.DATA_VALUE_COLUMNS)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=Engine.DATA_VALUE_COLUMNS)
+
+    def _iter_loaded_datavalues(self, session, data_value_url):
+        response = session.get(data_value_url, timeout=600)
+        try:
+            response.raise_for_status()  # an error page must not read as an empty window
+            data_to_get = json.loads(response.text)
+        finally:
+            response.close()
+        for item in data_to_get.get('dataValues', []):
+            yield {col: item.get(col) for col in Engine.DATA_VALUE_COLUMNS}
+
+    def _iter_json_datavalues(self, session, data_value_url):
+        with session.get(data_value_url, timeout=600, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # let urllib3 undo the gzip transfer encoding
+            for item in ijson.items(response.raw, 'dataValues.item'):
+                yield {col: item.get(col) for col in Engine.DATA_VALUE_COLUMNS}
+
+    def _iter_csv_datavalues(self, session, data_value_url):
+        csv_url = data_value_url.replace('dataValueSets?', 'dataValueSets.csv?', 1)
+        with session.get(csv_url, timeout=600, stream=True, headers={'Accept-Encoding': 'gzip'}) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # let urllib3 undo the gzip transfer encoding
+            # newline='' leaves line breaks inside quoted values to the csv module
+            reader = csv.reader(io.TextIOWrapper(response.raw, encoding='utf-8', newline=''))
+            header = next(reader, None)
+            if header is None:
+                return
+            header_index = {name.strip().lower(): i for i, name in enumerate(header)}
+            positions = []
+            for col, names in Engine.CSV_DATA_VALUE_COLUMNS.items():
+                found = [header_index[name] for name in names if name in header_index]
+                if not found:
+                    # A missing column would null every row and let the COC filter drop the whole window
+                    raise ValueError(f"dataValueSets.csv has no '{col}' column, header: {header}")
+                positions.append((col, found[0]))
+            for record in reader:
+                if not record:
+                    continue
+                row = dict.fromkeys(Engine.DATA_VALUE_COLUMNS)
+                for col, position in positions:
+                    if position < len(record):
+                        row[col] = record[position]
+                yield row
+
+    def push_values(self, after_filter_df, start_date, end_date, window=None):
+        """
+        Post a pulled and filtered set of data values in batches sized by 'self.batcher'.
+
+        Batches queued for conflict repair do not count as failed: the set is recorded in the checkpoint store
+        once they are re-posted (see settle_unit).
+
+        Returns:
+            bool: True when no batch failed (or the set is already recorded in the checkpoint store).
+        """
+        self.snapshot(after_filter_df, 'after_filter')
+        checkpointed = self.checkpoint is not None and window is not None
+        batch_hash = CheckpointStore.batch_hash(after_filter_df) if checkpointed else None
+        if checkpointed and self.checkpoint.is_done(self.data_element_in_view, self.filter_in_view, window, batch_hash):
+            self.logger.debug(f"{len(after_filter_df)} values of {window} already posted, skipping")
             return True
+        unit = (self.data_element_in_view, self.filter_in_view, window, batch_hash) if checkpointed else None
+
+        all_posted = True
+        if self.predictor is not None:
+            after_filter_df = self.route_predicted_conflicts(after_filter_df, start_date, end_date, unit)
+        total = len(after_filter_df)
+        start = 0
+        i = 0
+        jobs = []  # async import jobs still running
+        while start < total:
+            df_batch = after_filter_df.iloc[start:start + self.batcher.next_size()]
+            start += len(df_batch)
+            i += 1
+            self.logger.debug(f"*** Processing batch {i} - rows {start - len(df_batch) + 1} to {start} of {total} ***")
+            self.logger.debug(df_batch.head())  # Check the structure of the first few rows
+            filter_df_batch = df_batch.reset_index(drop=True)
+            self.snapshot(filter_df_batch, 'filter_df_batch')
+            # Check for missing data in this batch
+            missing_data = df_batch[
+                df_batch[
+                    ["dataElement", "period", "orgUnit", "categoryOptionCombo", "value"]].isnull().any(
+                    axis=1)
+            ]
+
+            if not missing_data.empty:
+                self.logger.debug(f"Batch {i} contains rows with missing data:")
+                all_posted = False  # the window is not complete without this batch
+                continue  # Skip the batch or handle it accordingly
+            # Convert the current batch to JSON
+            try:
+                converted_to_json = self.DataValueProcessing.get_datavalue(filter_df_batch)
+            except Exception as e:
+                self.logger.debug(f"Batch {i} could not be built, skipped: {e}")
+                all_posted = False
+                continue
+            data__ = Engine.serialize({"dataValues": converted_to_json})
+            self.logger.debug("*** Data serialized ***")
+            if self.async_import:
+                jobs.append(self.submit_batch(data__, len(filter_df_batch), i, start_date, end_date, unit))
+            elif not self.push_batch(data__, len(filter_df_batch), i, start_date, end_date, unit=unit):
+                all_posted = False
+            self.repair_conflicts()
+
+        for job in jobs:
+            if not job.result():
+                all_posted = False
+        self.settle_unit(unit, posted=all_posted)
+        return all_posted
+
+    def push_batch(self, data__, rows, batch_number, start_date, end_date, max_retries=2, requeue=True, unit=None):
+        """
+        Post one serialized dataValues batch with retry logic, feeding every response to the adaptive batcher.
+
+        A batch that comes back with conflicts is not retried here: its conflicts go to the conflict queue and,
+        with 'requeue', the batch is posted again by repair_conflicts once they are repaired. The checkpoint
+        'unit' the batch belongs to travels with it, so the unit can be recorded after the re-post.
+
+        Returns:
+            bool: True when the batch was imported without conflicts, or queued for re-post as part of a 'unit'.
+        """
+        for attempt in range(1, max_retries + 1):
+            self.logger.debug(f"Attempt {attempt} of {max_retries} to post data.")
+
+            # Post data
+            started = time.perf_counter()
+            try:
+                status_code, d = self.import_data_values(data__)
+            except TimeoutError as e:
+                # The async job may still be importing; posting the batch again would start a second job
+                self.batcher.record(rows, time.perf_counter() - started, len(data__), failed=True)
+                self.logger.debug(f"Posting batch {batch_number} failed, not resubmitted: {e}")
+                return False
+            except (rq.RequestException, ValueError, KeyError) as e:
+                self.batcher.record(rows, time.perf_counter() - started, len(data__), failed=True)
+                self.logger.debug(f"Posting batch {batch_number} failed: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            if status_code >= 500:
+                self.batcher.record(rows, elapsed, len(data__), status_code=status_code)
+                self.logger.debug(f"Posting batch {batch_number} failed: {status_code} - {d.get('text', '')[:500]}")
+                continue
+            conflicts = d.get('conflicts', [])
+            self.batcher.record(rows, elapsed, len(data__), status_code=status_code, conflicts=len(conflicts))
+
+            # If conflicts are found, queue them (and the batch) for the next repair
+            if conflicts:
+                batch = None
+                if requeue:
+                    batch = {'data': data__, 'rows': rows, 'batch_number': batch_number,
+                             'start_date': start_date, 'end_date': end_date, 'unit': unit}
+                    self.defer_unit(unit)
+                new_conflicts = self.conflict_queue.add(conflicts, batch)
+                self.record_conflicts(new_conflicts, start_date, end_date)
+                if requeue:
+                    self.logger.debug(f"Batch {batch_number}: {len(conflicts)} conflicts ({len(new_conflicts)} new), "
+                                      f"queued for repair and re-post")
+                    return unit is not None
+                self.logger.debug(f"Batch {batch_number}: conflicts remain unresolved after repair.")
+                return False
+
+            # If no conflicts, log and return
+            log_message = f"Data posted successfully for batch {batch_number}" + (" (dry run)" if self.dry_run else "")
+            self.logger.debug(log_message)
+            with self._lock:
+                with open(self.posted_file_path, 'a') as file:
+                    file.write(log_message + "\n")
+            return True  # Success
+
+        self.logger.debug(f"Max retries reached for batch {batch_number}.")
+        return False  # Failure after retries
+
+    def import_data_values(self, data__):
+        """
+        Import a serialized dataValues payload, synchronously or as an async job waited for with
+        wait_for_import_job, with dryRun=true in a dry run.
+
+        Returns:
+            tuple: (HTTP status code, import summary; {'text': body} for 5xx responses)
+        """
+        url = f"{self.destination_base_url}dataValueSets"
+        params = {'dryRun': 'true'} if self.dry_run else {}
+        if self.async_import:
+            params['async'] = 'true'
+        r = self.post_data(url=url, data=data__, params=params or None)
+        try:
+            if r.status_code >= 500:
+                return r.status_code, {'text': r.text}
+            d = r.json()
+        finally:
+            r.close()
+        if not self.async_import:
+            return r.status_code, d
+        return 200, self.wait_for_import_job(d.get('response', d))
+
+    def wait_for_import_job(self, job):
+        """
+        Poll system/tasks until an async import job completes and return its import summary from
+        system/taskSummaries.
+
+        Raises:
+            TimeoutError: When the job did not complete within 'job_timeout' seconds.
+            ValueError: When the summary could not be fetched.
+        """
+        job_type = job.get('jobType', 'DATAVALUE_IMPORT')
+        task_url = f"{self.destination_base_url}system/tasks/{job_type}/{job['id']}"
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            notifications = self.get_url_data(task_url, connection="destination")
+            if isinstance(notifications, list) and any(n.get('completed') for n in notifications):
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Import job {job['id']} did not complete in {self.job_timeout}s")
+            time.sleep(self.poll_interval)
+        summary = self.get_url_data(f"{self.destination_base_url}system/taskSummaries/{job_type}/{job['id']}",
+                                    connection="destination")
+        if not summary:
+            raise ValueError(f"No import summary for job {job['id']}")
+        return summary
+
+    def submit_batch(self, data__, rows, batch_number, start_date, end_date, unit=None):
+        """
+        Post a batch as an async import job in the background so the next batches can be prepared meanwhile.
+        Blocks while 'max_in_flight' jobs are running.
+
+        Returns:
+            Future: Resolves to the push_batch result.
+        """
+        self._import_slots.acquire()
+        future = self._import_pool.submit(self.push_batch, data__, rows, batch_number, start_date, end_date,
+                                          unit=unit)
+        future.add_done_callback(lambda _: self._import_slots.release())
+        return future
+
+    def record_conflicts(self, new_conflicts, start_date, end_date):
+        # Log new conflicts and append them to the conflicts file
+        with self._lock:
+            for value, error_code, prop in new_conflicts:
+                self.logger.debug(f"Value: {value}")
+                self.logger.debug(f"Error Code: {error_code}")
+                self.logger.debug(f"Property: {prop}")
+                self.logger.debug("---")
+
+                self.error_data.append([
+                    self.data_element_in_view, start_date, end_date, value, error_code, prop
+                ])
+            self.error_data_saving()
+
+    def route_predicted_conflicts(self, after_filter_df, start_date, end_date, unit=None):
+        """
+        Take the values the predictor expects to conflict out of a pulled set and queue them, with their
+        conflicts, for repair and re-post instead of posting them now. The queued batches carry the checkpoint
+        'unit' of the set.
+
+        Returns:
+            pd.DataFrame: The values to post now.
+        """
+        predicted, conflicts = self.predictor.predict(after_filter_df)
+        if not conflicts:
+            return after_filter_df
+        deferred_df = after_filter_df[predicted].reset_index(drop=True)
+        self.logger.debug(f"Pre-flight: {len(deferred_df)} of {len(after_filter_df)} values predicted to conflict "
+                          f"({len(conflicts)} conflicts), routed to repair")
+        # Queued in batches of the batcher's size so the re-post after the repair stays within its limits
+        start = 0
+        part = 0
+        while start < len(deferred_df):
+            chunk_df = deferred_df.iloc[start:start + self.batcher.next_size()]
+            start += len(chunk_df)
+            part += 1
+            data__ = Engine.serialize({"dataValues": self.DataValueProcessing.get_datavalue(chunk_df)})
+            batch = {'data': data__, 'rows': len(chunk_df), 'batch_number': f'pre-flight {part}',
+                     'start_date': start_date, 'end_date': end_date, 'unit': unit}
+            self.defer_unit(unit)
+            self.record_conflicts(self.conflict_queue.add(conflicts if part == 1 else [], batch),
+                                  start_date, end_date)
+        return after_filter_df[~predicted]
+
+    def repair_conflicts(self, force=False):
+        """
+        Repair the conflicts queued since the last repair with FixErrors and post the affected batches again.
+
+        Called after every batch, it does nothing until the conflict queue is due (or 'force'), and only one
+        post worker repairs at a time; the others keep posting. The outcome of every re-post is handed to
+        settle_unit, which records the checkpoint unit of the batch once all of its queued batches went through.
+        """
+        if not (force or self.conflict_queue.due()):
+            return
+        if not self._repair_lock.acquire(blocking=force):
+            return
+        batches = []
+        try:
+            conflicts, batches = self.conflict_queue.drain()
+            if self.dry_run:
+                # The conflicts are already in the conflicts file; a dry run changes no metadata
+                self.logger.debug(f"Dry run: skipping the repair of {len(conflicts)} conflicts")
+                return
+            if conflicts:
+                FixErrors(engine_class=self).resolve_conflicts(conflicts, triggered='Automatically')
+                if self.predictor is not None:
+                    self.predictor.invalidate()
+            while batches:
+                batch = batches.pop(0)
+                reposted = self.push_batch(batch['data'], batch['rows'], batch['batch_number'], batch['start_date'],
+                                           batch['end_date'], requeue=False)
+                if not reposted:
+                    self.logger.warning(f"Re-post of batch {batch['batch_number']} ({batch['start_date']} - "
+                                        f"{batch['end_date']}) failed after the repair, its window stays "
+                                        f"unmarked in the checkpoint store")
+                self.settle_unit(batch.get('unit'), reposted=reposted)
+        finally:
+            # Batches not re-posted (dry run or a failed repair) leave their units unmarked
+            for batch in batches:
+                self.settle_unit(batch.get('unit'), reposted=False)
+            self._repair_lock.release()
 
     @staticmethod
-    def clean_up(clean):
-        dictionary = {'\'': '"', '.0': '',
-                      'False': 'false',
-                        'True': 'true',
-                          'nan': '',}
-        for key in dictionary.keys():
-            clean = clean.replace(key, dictionary[key])
-        return clean
+    def serialize(payload):
+        """
+        Serialize a metadata or dataValues payload straight to UTF-8 JSON bytes.
+
+        NaN/inf become null, integral floats are written as integers (5.0 -> 5) and numpy scalars are unwrapped
+        in a single walk over the payload; strings are never rewritten. orjson is used when it is installed and
+        the stdlib json module otherwise, both producing the same compact output.
+
+        Args:
+            payload (dict | list): The structure to post, e.g. {"dataValues": [...]}.
+
+        Returns:
+            bytes: UTF-8 encoded JSON.
+        """
+        normalized = Engine._normalize_json(payload)
+        if orjson is not None:
+            return orjson.dumps(normalized)
+        return json.dumps(normalized, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+    @staticmethod
+    def _normalize_json(obj):
+        if isinstance(obj, dict):
+            return {key: Engine._normalize_json(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [Engine._normalize_json(value) for value in obj]
+        if isinstance(obj, np.generic):
+            obj = obj.item()
+        if isinstance(obj, float):
+            if math.isnan(obj) or math.isinf(obj):
+                return None
+            if obj.is_integer():
+                return int(obj)
+        return obj
 
     @staticmethod
     def create_csv(data, obj):
@@ -969,75 +1992,101 @@ class Engine:
                            current_year - i * 3 >= current_year - self.years_back])
 
     def delete_datavalues(self, data_element_in_view_to_delete):
+        """
+        Delete the migrated values of the data element group from the destination, year by year.
+
+        Each year is streamed from the destination with pull_datavalues and deleted in batches of 'batch_size'
+        rows, 'workers' importStrategy=DELETE posts at a time. A year is recorded in the checkpoint store under the
+        'delete:' key of the group once all of its batches are deleted, so a resumed deletion skips the finished
+        years; in an unfinished year the values already deleted are no longer returned by the pull, so only the
+        remaining ones are deleted. With 'count_only' the values are only counted.
+        """
         self.update_dataset(data_element_in_view_to_delete)
         self.data_element_in_view = data_element_in_view_to_delete
         self.create_update_data_element_group(mode='update')
+        checkpoint_key = f"delete:{self.data_element_group_id}"
+        total = 0
         for year in self.generate_years():
-            duration = f"startDate={year}-01-01&endDate={year}-12-31"
-            data_value_url = f"{self.destination_base_url}dataValueSets?dataSet={self.migration_dataset_id}&{duration}" \
+            if self.checkpoint is not None and self.checkpoint.is_done(checkpoint_key, self.org_unit_group, year):
+                self.logger.debug(f"Skipping {year}, already deleted")
+                continue
+            data_value_url = f"{self.destination_base_url}dataValueSets?dataSet={self.migration_dataset_id}" \
+                             f"&startDate={year}-01-01&endDate={year}-12-31" \
                              f"&dataElementGroup={self.data_element_group_id}" \
                              f"&orgUnitGroup={self.org_unit_group}"
-            _df = None
-            data_to_get = None
             try:
-                response = self.destination_session.get(data_value_url, timeout=600)
-                data_to_get = json.loads(response.text)
-                response.close()
-                self.logger.debug(f"Data pull completed for ... {duration}")
+                if self.delete_count_only:
+                    count = self.count_datavalues(data_value_url)
+                    self.logger.debug(f"{count} dataValues to delete for {year}")
+                else:
+                    count = self.delete_year(data_value_url, year, checkpoint_key)
             except Exception as ex:
-                self.logger.debug(f"[{self.klass}] - {ex}")
-            if data_to_get is not None:
-                if 'dataValues' in data_to_get:
-                    _df = pd.json_normalize(data_to_get)
-                    self.logger.debug(f"normalized data been processed... ")
-            else:
-                self.logger.debug(f"Error getting response data.")
-
-            if _df is not None:
-                if not _df.empty:
-                    try:  ## implemented the exception to catch empty requests
-                        self.logger.debug(f"dataValues pulled - {len(_df['dataValues'][0])}")
-                        if len(_df['dataValues'][0]) > 0:
-                            df0 = pd.DataFrame(_df['dataValues'][0])
-                            df0 = df0[
-                                ['dataElement', 'period', 'orgUnit', 'categoryOptionCombo', 'attributeOptionCombo',
-                                 'value']]
-
-                            # new data element uid
-                            df0 = df0.copy()
-                            with pd.ExcelWriter("data_value_to_delete.xlsx") as writer:
-                                df0.to_excel(writer, sheet_name='to_delete', index=False)
-                            after_filter_df = pd.read_excel("data_value_to_delete.xlsx", sheet_name=0)
-
-                            converted_to_json = self.DataValueProcessing.get_datavalue(after_filter_df)
-                            get_datavalue = {"dataValues": converted_to_json}
-
-                            data = Engine.clean_up(str(get_datavalue))
-                            self.logger.debug("======== data Before Start ========")
-                            self.logger.debug(data)
-                            self.logger.debug("======== data End Start ========")
-                            params = {'importStrategy': 'DELETE'}
-                            r = self.post_data(
-                                url=f"{self.destination_base_url}dataValueSets", data=data, params=params
-                            )
-                            d = r.json()
-                            r.close()
-                            self.logger.debug(f"-posting-{d}")
-                            # del get_datavalue, df0, _df, df0_filtered
-
-                            del d, r, get_datavalue, df0, _df
+                self.logger.debug(f"[{self.klass}] - deleting for {year} failed: {ex}")
+                continue
+            total += count
+        verb = "to delete" if self.delete_count_only else "deleted"
+        self.logger.debug(f"{total} dataValues {verb} for {self.data_element_group_id}")
+        return total
+
+    def count_datavalues(self, data_value_url):
+        # dataValueSets has no count endpoint, the values are streamed and counted without being kept
+        return sum(len(batch) for batch in self.pull_datavalues(data_value_url, session=self.destination_session,
+                                                                 batch_size=self.delete_batch_size))
+
+    def delete_year(self, data_value_url, year, checkpoint_key):
+        """
+        Stream one year from the destination and delete it in concurrent batches.
 
-                        else:
-                            self.logger.debug(f"dataset empty, nothing to delete ")
-                            pass
-                    except Exception as e:
-                        self.logger.debug(f"deleting for period : _df is empty ")
-                else:
-                    self.logger.debug(f" dataset empty, nothing to delete")
-                    pass
-            else:
-                self.logger.debug(f" dataset empty, nothing to delete")
-                pass
+        Returns:
+            int: The values the destination reported as deleted.
+        """
+        slots = threading.BoundedSemaphore(self.delete_workers * 2)  # bounds the batches held in memory
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.delete_workers, thread_name_prefix="delete-worker") as pool:
+            for i, batch_df in enumerate(self.pull_datavalues(data_value_url, session=self.destination_session,
+                                                             batch_size=self.delete_batch_size), start=1):
+                slots.acquire()
+                future = pool.submit(self.delete_batch, batch_df, i, year)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+        results = [future.result() for future in futures]
+        deleted = sum(count for count in results if count is not None)
+        if results and None not in results and self.checkpoint is not None:
+            self.checkpoint.mark_done(checkpoint_key, self.org_unit_group, year)
+        elif not results:
+            self.logger.debug(f"dataset empty, nothing to delete for {year}")
+        self.logger.debug(f"Deleted {deleted} dataValues in {len(results)} batches for {year}")
+        return deleted
+
+    def delete_batch(self, batch_df, batch_number, year):
+        """
+        Post one batch with importStrategy=DELETE.
+
+        Returns:
+            int | None: The deleted count from the import summary, None when the batch failed.
+        """
+        params = {'importStrategy': 'DELETE'}
+        if self.dry_run:
+            params['dryRun'] = 'true'
+        try:
+            data = Engine.serialize({"dataValues": self.DataValueProcessing.get_datavalue(batch_df)})
+        except Exception as e:
+            self.logger.debug(f"Batch {batch_number} of {year} could not be built: {e}")
+            return None
+        try:
+            r = self.post_data(url=f"{self.destination_base_url}dataValueSets", data=data, params=params)
+            d = r.json()
+            r.close()
+        except (rq.RequestException, ValueError) as e:
+            self.logger.debug(f"Deleting batch {batch_number} of {year} failed: {e}")
+            return None
+        summary = d.get('response', d)  # newer servers wrap the import summary
+        if r.status_code >= 400 or summary.get('status') == 'ERROR':
+            self.logger.debug(f"Deleting batch {batch_number} of {year} failed: {r.status_code} - {summary}")
+            return None
+        deleted = summary.get('importCount', {}).get('deleted', 0)
+        self.logger.debug(f"Batch {batch_number} of {year}: {deleted} of {len(batch_df)} dataValues deleted")
+        return deleted
 
     def error_data_saving(self):
         try:
@@ -1087,186 +2136,192 @@ class FixErrors:
         if filtered_data:  # Only append if there's data left after filtering
             self.structured_data.append(filtered_data)
 
-    def resolve_errors(self):
-        # Grouping the data by attribute_option_combo
-        aoc_grouped_data = {}
+    # Data elements, category combos and names of the self test data that are never fixed
+    SELF_TEST_IDS = [
+        "BXaeeRcNC1w",
+        "GlfMR8YUlsQ",
+        "SENLBIzJJi8",
+        "ns4Ckbq5FvQ",
+        "jLrgY7klJdM",
+        "WL1H0ysVO8m",
+        "xEVxb6wy4ky",
+        "EJxre1x0VgD",
+        "ZFPaJ7pQ0Fl",
+        "xqpn4UoFXOG",
+        "MByYBLdGmqS",
+        "LYsAcDNybjW",
+        "B27oFNJWjYS",
+        "w58CMjcedn3",
+        "Cn3JXp4vNyG",
+        "HTS_SELF: Continuation",
+        "HTS_SELF_CONFIRMED: Continuation",
+        "HTS_SELF_LINKED: Continuation",
+        "HTS_SELF_REACTIVE: Continuation",
+        "HTS_SELF_USED: Continuation"
+    ]
+    # Server managed properties removed before metadata is imported again
+    READ_ONLY_PROPERTIES = ["createdBy", "lastUpdatedBy", "user", "created", "lastUpdated", "href"]
 
+    def resolve_errors(self):
+        """
+        Fix the metadata behind the structured conflicts with one metadata import.
+
+        All referenced category option combos, data elements, attribute option combos and category options are
+        fetched up front, one filter=id:in:[...] request per metadata type and chunk of ids, and the fixes are
+        built in memory:
+          - category option combos are moved to the category combo of their data element;
+          - the conflicting org units are added to the category options of the attribute option combos.
+        Category options the import rejects get their dates and name corrected and are imported once more.
+        """
         # Extract unique items with 'attribute_option_combo' or category_option_combo and then make the list unique
         attribute_combo_items = list({(item['org_unit'], item['attribute_option_combo']): item for item
                                       in self.structured_data if "attribute_option_combo" in item}.values())
-        print("attribute_combo_items: ", attribute_combo_items)
+        logger.debug(f"attribute_combo_items: {len(attribute_combo_items)}")
         category_options_combo_items = list({(item['data_element'], item['category_option_combo']): item for item
                                              in self.structured_data if "category_option_combo" in item}.values())
-        print("category_options_combo_items: ", category_options_combo_items)
-        # List of dataElement IDs
-        self_test_data_element_and_coc_ids = [
-            "BXaeeRcNC1w",
-            "GlfMR8YUlsQ",
-            "SENLBIzJJi8",
-            "ns4Ckbq5FvQ",
-            "jLrgY7klJdM",
-            "WL1H0ysVO8m",
-            "xEVxb6wy4ky",
-            "EJxre1x0VgD",
-            "ZFPaJ7pQ0Fl",
-            "xqpn4UoFXOG",
-            "MByYBLdGmqS",
-            "LYsAcDNybjW",
-            "B27oFNJWjYS",
-            "w58CMjcedn3",
-            "Cn3JXp4vNyG",
-            "HTS_SELF: Continuation",
-            "HTS_SELF_CONFIRMED: Continuation",
-            "HTS_SELF_LINKED: Continuation",
-            "HTS_SELF_REACTIVE: Continuation",
-            "HTS_SELF_USED: Continuation"
-        ]
+        logger.debug(f"category_options_combo_items: {len(category_options_combo_items)}")
 
+        metadata_fixes = {}
         if len(category_options_combo_items) > 0:
-            _data = []
-            dev_session = rq.Session()  # Consider using a session for connection reuse
-            dev_session.auth = ('aejakhegbe', '%Wekgc7345dgfgfq#')
-            dev_url = 'https://infolink-dev.baosystems.com/api/29/'
-            n = 0
-            for entry in category_options_combo_items:
-                print(f"Processing category_options_combo_items index {n}")
-                if entry['data_element'] not in self_test_data_element_and_coc_ids:
-                    coc_data_ = self.engine.get_url_data(f"{self.engine.destination_base_url}categoryOptionCombos/"
-                                                         f"{entry['category_option_combo']}.json")
-                    de_data_ = self.engine.get_url_data(
-                        f"{self.engine.destination_base_url}dataElements/{entry['data_element']}.json")
-                    # Load the JSON string into a Python dictionary
-                    de_data_json = json.loads(json.dumps(de_data_))
-
-                    # Access the httpStatusCode
-                    http_status_code = de_data_json['httpStatusCode']
-                    if http_status_code == 404:
-
-                        # print("Pulling   - HTTP Status Code:", http_status_code)
-
-                        de_data_ = self.engine.get_url_data(
-                            f"{dev_url}dataElements/{entry['data_element']}.json",
-                            session=dev_session)
-                        # data_structured_ = {f"dataElements": [de_data_]}
-                        # data__ = Engine.clean_up(str(data_structured_))
-                        # logger.debug("data_structured: ", data__)
-                        # params = {'importStrategy': 'CREATE_UPDATE'}
-                        # create_de_response_update_ = self.post_data(url=f"{self.engine.destination_base_url}metadata",
-                        #                                             data_=data__, params=params)
-                        # logger.debug("Status %s", json.dumps(create_de_response_update_.status_code))
-                        # logger.debug("Response %s", json.dumps(create_de_response_update_.text))
-                        # logger.debug(f'++ Updating or creating Data Element {de_data_["name"]} ++')
-                    if de_data_['name'] not in self_test_data_element_and_coc_ids:
-                        if de_data_["categoryCombo"]["id"] not in self_test_data_element_and_coc_ids:
-                            try:
-                                logger.debug(f"Processing for data element {de_data_['id']} - {de_data_['name']}")
-                                coc_data_["categoryCombo"]["id"] = de_data_["categoryCombo"]["id"]
-
-                                del coc_data_["lastUpdatedBy"]
-                                del coc_data_["created"]
-                                del coc_data_["lastUpdated"]
-                                del coc_data_["href"]
-                                _data.append(coc_data_)
-                            except Exception as e:
-                                logger.debug(f"Error for data element {de_data_}")
-                                logger.debug(e)
-                    n = n + 1
-            # Use a set to track unique IDs and filter duplicates
-            unique_ids = set()
-            unique_combos = []
-
-            for combo in _data:
-                if combo['id'] not in unique_ids:
-                    unique_ids.add(combo['id'])
-                    unique_combos.append(combo)
-            coc_data_structured_ = {"categoryOptionCombos": unique_combos}
-            category_option_combos_data_ = self.engine.clean_up(str(coc_data_structured_))
-            print(category_option_combos_data_)
-            params = {'importStrategy': 'UPDATE'}
-            category_option_combos_response_update_ = self.post_data(url=f"{self.engine.destination_base_url}metadata",
-                                                                     data_=category_option_combos_data_, params=params)
-            logger.debug("Status %s", json.dumps(category_option_combos_response_update_.status_code))
-            logger.debug("Response %s", json.dumps(category_option_combos_response_update_.text))
-
-        # print("attribute_combo_items: ", attribute_combo_items)
+            metadata_fixes["categoryOptionCombos"] = self.build_coc_fixes(category_options_combo_items)
         if len(attribute_combo_items) > 0:
-            for entry in attribute_combo_items:
-                attribute_combo = entry['attribute_option_combo']
-                org_unit = entry['org_unit']
-
-                if attribute_combo not in aoc_grouped_data:
-                    aoc_grouped_data[attribute_combo] = []  # Initialize a new list if key doesn't exist
-
-                aoc_grouped_data[attribute_combo].append(org_unit)  # Append the org_unit to the respective list
-
-            for attribute_option_combo, org_units in aoc_grouped_data.items():
-                aoc_data_ = self.engine.get_url_data(f"{self.engine.destination_base_url}categoryOptionCombos/"
-                                                     f"{attribute_option_combo}.json?fields=categoryOptions[id,name]")
-                for option in aoc_data_['categoryOptions']:
-                    if option['name'] not in ["COP", "DSD"]:
-                        cat_option_data = self.engine.get_url_data(
-                            f"{self.engine.destination_base_url}categoryOptions/{option['id']}.json")
-                        for org_unit in org_units:
-                            cat_option_data['organisationUnits'].append({"id": org_unit})
-                        del cat_option_data["createdBy"], cat_option_data["lastUpdatedBy"]
-                        del cat_option_data["user"], cat_option_data["created"]
-                        del cat_option_data["lastUpdated"]
-                        del cat_option_data["href"]
-                        # print(cat_option_data)
-                        # cat_option_data["startDate"] = FixErrors.correct_date_format(cat_option_data["startDate"])
-                        coc_data_structured_ = {"categoryOptions": [cat_option_data]}
-                        corrected_data_ = self.engine.clean_up(str(coc_data_structured_))
-                        # print(coc_data_structured_)
-                        params = {'importStrategy': 'UPDATE'}
-                        response_update_category_options = self.post_data(url=f"{self.engine.destination_base_url}metadata",
-                                                                          data_=corrected_data_, params=params,
-                                                                          data_structured_=coc_data_structured_)
-                        if json.dumps(response_update_category_options.status_code) == "200":
-                            logger.debug("Status %s", json.dumps(response_update_category_options.status_code))
-                            logger.debug("Response %s", json.dumps(response_update_category_options.text))
-                        else:
-                            # Check if 'startDate' exists
-                            if "startDate" in cat_option_data:
-                                cat_option_data["startDate"] = FixErrors.correct_date_format(cat_option_data["startDate"])
-                            else:
-                                print("startDate does not exist.")
-
-                            if "endDate" in cat_option_data:
-                                cat_option_data["endDate"] = FixErrors.correct_date_format(
-                                    cat_option_data["endDate"])
-                            new_name_ = FixErrors.clean_utf8_string(cat_option_data['name'])
-                            # Collect problematic entries
-                            error_data = []
-
-                            error_data.append([
-                                cat_option_data['name'],
-                                cat_option_data['id'],
-                                new_name_  # Placeholder if you want to suggest a corrected name
-                            ])
-                            #
-                            # # Check if file exists
-                            error_names_df = pd.DataFrame(error_data, columns=['name', 'id', 'New Name'])
-                            if not os.path.exists("Changed Options Names.csv"):
-                                # If file does not exist, write header
-                                error_names_df.to_csv("Changed Options Names.csv", index=False)
-                            else:
-                                # If file exists, append without writing the header again
-                                error_names_df.to_csv("Changed Options Names.csv", mode='a', index=False, header=False)
-
-                            cat_option_data["name"] = new_name_
-                            cat_option_data["displayName"] = new_name_
-                            cat_option_data["displayFormName"] = new_name_
-                            cat_option_data["displayShortName"] = new_name_
-                            cat_option_data["shortName"] = FixErrors.enforce_shortname_limit(new_name_)
-                            coc_data_structured_ = {"categoryOptions": [cat_option_data]}
-                            corrected_data_ = self.engine.clean_up(str(coc_data_structured_))
-                            print(json.dumps(coc_data_structured_))
-                            params = {'importStrategy': 'UPDATE'}
-                            response_update_category_options = self.post_data(
-                                url=f"{self.engine.destination_base_url}metadata",
-                                data_=corrected_data_, params=params, data_structured_=coc_data_structured_)
-                            logger.debug("Status Again %s", json.dumps(response_update_category_options.status_code))
-                            logger.debug("Response Again %s", json.dumps(response_update_category_options.text))
+            metadata_fixes["categoryOptions"] = self.build_category_option_fixes(attribute_combo_items)
+        metadata_fixes = {metadata: objects for metadata, objects in metadata_fixes.items() if objects}
+        if not metadata_fixes:
+            logger.debug("No metadata to fix")
+            return
+
+        failed_uids = self.import_fixes(metadata_fixes)
+        retry_options = [option for option in metadata_fixes.get("categoryOptions", []) if option['id'] in failed_uids]
+        if retry_options:
+            self.import_fixes({"categoryOptions": self.correct_category_options(retry_options)}, label="Again")
+
+    def fetch_by_ids(self, metadata, ids, fields=":owner", connection="destination"):
+        return self.engine.get_metadata_by_ids(metadata, ids, fields=fields, connection=connection)
+
+    def build_coc_fixes(self, category_options_combo_items):
+        """
+        Category option combos moved to the category combo of the data element they conflicted with.
+        """
+        entries = [entry for entry in category_options_combo_items
+                   if entry['data_element'] not in self.SELF_TEST_IDS]
+        cocs = self.fetch_by_ids("categoryOptionCombos", [entry['category_option_combo'] for entry in entries])
+        de_ids = [entry['data_element'] for entry in entries]
+        data_elements = self.fetch_by_ids("dataElements", de_ids, fields="id,name,categoryCombo[id]")
+        # Data elements missing on the destination are looked up on the source server
+        missing_de_ids = [de_id for de_id in de_ids if de_id not in data_elements]
+        if missing_de_ids:
+            data_elements.update(self.fetch_by_ids("dataElements", missing_de_ids, fields="id,name,categoryCombo[id]",
+                                                   connection="source"))
+
+        unique_combos = {}
+        for entry in entries:
+            coc_data_ = cocs.get(entry['category_option_combo'])
+            de_data_ = data_elements.get(entry['data_element'])
+            if coc_data_ is None or de_data_ is None:
+                logger.debug(f"Metadata not found for {entry}")
+                continue
+            if de_data_['name'] in self.SELF_TEST_IDS or de_data_["categoryCombo"]["id"] in self.SELF_TEST_IDS:
+                continue
+            # Use a dict to keep the first fix of each combo
+            if coc_data_['id'] in unique_combos:
+                continue
+            logger.debug(f"Processing for data element {de_data_['id']} - {de_data_['name']}")
+            coc_fix = {k: v for k, v in coc_data_.items() if k not in self.READ_ONLY_PROPERTIES}
+            coc_fix["categoryCombo"] = {"id": de_data_["categoryCombo"]["id"]}
+            unique_combos[coc_fix['id']] = coc_fix
+        return list(unique_combos.values())
+
+    def build_category_option_fixes(self, attribute_combo_items):
+        """
+        Category options of the attribute option combos with the conflicting org units added.
+        """
+        # Grouping the org units by attribute_option_combo
+        aoc_grouped_data = {}
+        for entry in attribute_combo_items:
+            aoc_grouped_data.setdefault(entry['attribute_option_combo'], []).append(entry['org_unit'])
+
+        aocs = self.fetch_by_ids("categoryOptionCombos", list(aoc_grouped_data), fields="id,categoryOptions[id,name]")
+        option_org_units = {}
+        for attribute_option_combo, org_units in aoc_grouped_data.items():
+            aoc_data_ = aocs.get(attribute_option_combo)
+            if aoc_data_ is None:
+                logger.debug(f"Attribute option combo {attribute_option_combo} not found")
+                continue
+            for option in aoc_data_['categoryOptions']:
+                if option['name'] not in ["COP", "DSD"]:
+                    option_org_units.setdefault(option['id'], []).extend(org_units)
+
+        options = self.fetch_by_ids("categoryOptions", list(option_org_units))
+        fixes = []
+        for option_id, org_units in option_org_units.items():
+            cat_option_data = options.get(option_id)
+            if cat_option_data is None:
+                logger.debug(f"Category option {option_id} not found")
+                continue
+            cat_option_data = {k: v for k, v in cat_option_data.items() if k not in self.READ_ONLY_PROPERTIES}
+            assigned = [org_unit['id'] for org_unit in cat_option_data.get('organisationUnits', [])]
+            for org_unit in dict.fromkeys(org_units):
+                if org_unit not in assigned:
+                    cat_option_data.setdefault('organisationUnits', []).append({"id": org_unit})
+            fixes.append(cat_option_data)
+        return fixes
+
+    def import_fixes(self, metadata_fixes, label=""):
+        """
+        Import the fixes as one metadata import, objects are imported independently (atomicMode=NONE).
+
+        Returns:
+            set: uids of the objects the import rejected.
+        """
+        logger.debug(f"Importing metadata fixes {label}: "
+                     + ", ".join(f"{len(objects)} {metadata}" for metadata, objects in metadata_fixes.items()))
+        params = {'importStrategy': 'UPDATE', 'atomicMode': 'NONE'}
+        response = self.post_data(url=f"{self.engine.destination_base_url}metadata",
+                                  data_=self.engine.serialize(metadata_fixes), params=params,
+                                  data_structured_=metadata_fixes)
+        logger.debug(f"Status {label} %s", json.dumps(response.status_code))
+        logger.debug(f"Response {label} %s", json.dumps(response.text))
+        try:
+            report = response.json()
+        except ValueError:
+            report = {}
+        report = report.get('response', report)
+        failed_uids = {object_report.get('uid')
+                       for type_report in report.get('typeReports', [])
+                       for object_report in type_report.get('objectReports', [])
+                       if object_report.get('errorReports')}
+        if not response.ok and not failed_uids:
+            # The report does not tell which objects failed, treat them all as failed
+            failed_uids = {obj['id'] for objects in metadata_fixes.values() for obj in objects}
+        return failed_uids
+
+    def correct_category_options(self, category_options):
+        """
+        Correct the date format and clean the names of rejected category options.
+        The changed names are recorded in 'Changed Options Names.csv'.
+        """
+        error_data = []
+        for cat_option_data in category_options:
+            # Check if 'startDate' exists
+            if "startDate" in cat_option_data:
+                cat_option_data["startDate"] = FixErrors.correct_date_format(cat_option_data["startDate"])
+            if "endDate" in cat_option_data:
+                cat_option_data["endDate"] = FixErrors.correct_date_format(cat_option_data["endDate"])
+            new_name_ = FixErrors.clean_utf8_string(cat_option_data['name'])
+            # Collect problematic entries
+            error_data.append([cat_option_data['name'], cat_option_data['id'], new_name_])
+            cat_option_data["name"] = new_name_
+            cat_option_data["displayName"] = new_name_
+            cat_option_data["displayFormName"] = new_name_
+            cat_option_data["displayShortName"] = new_name_
+            cat_option_data["shortName"] = FixErrors.enforce_shortname_limit(new_name_)
+
+        error_names_df = pd.DataFrame(error_data, columns=['name', 'id', 'New Name'])
+        # If file exists, append without writing the header again
+        write_header = not os.path.exists("Changed Options Names.csv")
+        error_names_df.to_csv("Changed Options Names.csv", mode='a', index=False, header=write_header)
+        return category_options
 
     def post_data(self, url=None, data_=None, params=None, data_structured_=None):
         return self.engine.post_data(url=url, data=data_, params=params, data_structured_=data_structured_)
@@ -1303,6 +2358,46 @@ class FixErrors:
     def get_structured_data(self):
         return self.structured_data
 
+    def structure_conflict(self, value, error_code, prop):
+        """
+        Parse a dataValueSets conflict message into structured_data.
+        """
+        # Define regex patterns based on the type of error in the 'Value' column
+        org_unit_pattern = r"Organisation unit: `([^`]+)` is not valid for attribute option combo: `([^`]+)`"
+        category_combo_pattern = r"Category option combo: `([^`]+)` must be part of category combo of data element: `([^`]+)`"
+        if not isinstance(value, str):
+            return
+
+        if prop == "orgUnit":
+            # Match organisation unit and attribute option combo
+            org_unit_match = re.search(org_unit_pattern, value)
+            if org_unit_match:
+                org_unit = org_unit_match.group(1)
+                attribute_option_combo = org_unit_match.group(2)
+                # Call fix_errors for Organisation Unit
+                self.structure_errors_data(org_unit=org_unit,
+                                           attribute_option_combo=attribute_option_combo,
+                                           error_code=error_code)
+        if prop == "categoryOptionCombo":
+            # Match category option combo and data element
+            category_combo_match = re.search(category_combo_pattern, value)
+            if category_combo_match:
+                category_option_combo = category_combo_match.group(1)
+                data_element = category_combo_match.group(2)
+                # Call fix_errors for Category Option Combo
+                self.structure_errors_data(category_option_combo=category_option_combo,
+                                           data_element=data_element,
+                                           error_code=error_code)
+
+    def resolve_conflicts(self, conflicts, triggered='Manually'):
+        """
+        Resolve a list of (value, error code, property) conflicts, e.g. drained from the ConflictQueue.
+        """
+        logger.debug(f"Resolving {len(conflicts)} conflicts: triggered {triggered}")
+        for value, error_code, prop in conflicts:
+            self.structure_conflict(value, error_code, prop)
+        self.resolve_errors()
+
     def extract_metadata(self, triggered='Manually'):
         # Load the CSV file
         logger.debug(f"Resolving conflict started: triggered {triggered}")
@@ -1313,37 +2408,10 @@ class FixErrors:
         # Keep only unique rows based on 'Value', 'Error Code', and 'Property'
         error_data_unique = error_data_.drop_duplicates(subset=["Value", "Error Code", "Property"])
         logger.debug(f"Unique records in {file_path}  - length => {len(error_data_unique)}")
-        # Iterate through each row of the CSV
-        for index_, row in error_data_unique.iterrows():
-            # Extract the relevant columns: 'Value', 'Error Code', 'Property'
-            value = row['Value']
-            error_code = row['Error Code']
-            # Define regex patterns based on the type of error in the 'Value' column
-            org_unit_pattern = r"Organisation unit: `([^`]+)` is not valid for attribute option combo: `([^`]+)`"
-            category_combo_pattern = r"Category option combo: `([^`]+)` must be part of category combo of data element: `([^`]+)`"
-
-            if row['Property'] == "orgUnit":
-                # Match organisation unit and attribute option combo
-                org_unit_match = re.search(org_unit_pattern, value)
-                if org_unit_match:
-                    org_unit = org_unit_match.group(1)
-                    attribute_option_combo = org_unit_match.group(2)
-                    # Call fix_errors for Organisation Unit
-                    self.structure_errors_data(org_unit=org_unit,
-                                               attribute_option_combo=attribute_option_combo,
-                                               error_code=error_code)
-            if row['Property'] == "categoryOptionCombo":
-                # Match category option combo and data element
-                category_combo_match = re.search(category_combo_pattern, value)
-                if category_combo_match:
-                    category_option_combo = category_combo_match.group(1)
-                    data_element = category_combo_match.group(2)
-                    # Call fix_errors for Category Option Combo
-                    self.structure_errors_data(category_option_combo=category_option_combo,
-                                               data_element=data_element,
-                                               error_code=error_code)
-
-        # unique_data = list({(item['category_option_combo'], item['data_element']): item for item in self.get_structured_data()}.values())
+        # Structure each conflict: 'Value', 'Error Code', 'Property'
+        for value, error_code, prop in error_data_unique[["Value", "Error Code", "Property"]].itertuples(index=False):
+            self.structure_conflict(value, error_code, prop)
+
         self.resolve_errors()
 
 
@@ -1362,28 +2430,40 @@ class DataValueProcessing:
         self._logger = log
 
     def get_datavalue(self, df):
-        json_list = []
-        # Convert DataFrame to JSON
-        # json_data = df.to_json(orient='records')
-        n = 0
-        for row in df.values:
-            try:
-                value = df["value"][n]
-                # Exclude only if value is NaN
-                if not math.isnan(value):  # This works regardless if value is a float or integer
-                    json_list.append({
-                        "dataElement": df["dataElement"][n],
-                        "period": str(df["period"][n]),
-                        "orgUnit": df["orgUnit"][n],
-                        "categoryOptionCombo": df["categoryOptionCombo"][n],
-                        "attributeOptionCombo": df["attributeOptionCombo"][n],
-                        "value": str(df["value"][n])
-                    })
-            except Exception as e:
-                self.logger.debug(f'{n} - Error : {e}')
-            n = n + 1
-        # return json_data #json_list
-        return json_list  # json_list
+        """
+        Build the dataValues payload records for a batch of data values.
+
+        Rows without a value are dropped, 'period' and 'value' are cast to strings with column-wise pandas
+        operations and the records are emitted with to_dict('records') instead of a per-row Python loop.
+        Integral float values (e.g. 5.0 coming from a numeric column) are written without the trailing '.0'.
+        A batch that cannot be built raises, so the callers never post or checkpoint a partial payload.
+
+        Args:
+            df (pd.DataFrame): Data values with the columns in 'Engine.DATA_VALUE_COLUMNS'.
+
+        Returns:
+            list: One dict per data value, ready to be posted under "dataValues".
+        """
+        columns = ["dataElement", "period", "orgUnit", "categoryOptionCombo", "attributeOptionCombo", "value"]
+        records = df.loc[df["value"].notna(), columns]
+        records = records.assign(period=DataValueProcessing.to_str(records["period"]),
+                                 value=DataValueProcessing.to_str(records["value"]))
+        return records.to_dict('records')
+
+    @staticmethod
+    def to_str(series):
+        """Cast a Series to str, writing integral floats without their trailing '.0'."""
+        if pd.api.types.is_float_dtype(series):
+            integral = series.notna() & (series % 1 == 0)
+            as_str = series.astype(str)
+            # int64 wraps at 2**63; larger integral floats are formatted one by one
+            small = integral & (series.abs() < 2 ** 63)
+            as_str[small] = series[small].astype('int64').astype(str)
+            large = integral & ~small
+            if large.any():
+                as_str[large] = series[large].map('{:.0f}'.format)
+            return as_str
+        return series.astype(str)
 
 
 if __name__ == "__main__":
@@ -1418,10 +2498,50 @@ if __name__ == "__main__":
     process_category_combination_maintenance = False  # default is True (True runs the CC configurations)
     process_data_values = True  # Migrate data Value after metadata functions
     org_unit_group_ = 'DoVcSNLg5rm' # should be automated soon
-    connection_ = Connection(logger)
+    # Pooled sessions with retry/backoff on 429/5xx/timeouts; compress_requests needs server support for gzip bodies
+    connection_ = Connection(logger, transport=Transport(pool_size=20, retries=5, backoff_factor=1.0,
+                                                         compress_requests=False, log=logger))
+    # Posted windows and batches survive restarts here; delete the file to migrate everything again
+    checkpoint_ = CheckpointStore('migration_checkpoint.db', logger)
+    # name -> id lookups for the metadata checks, reused across runs for 24 hours
+    metadata_index_ = MetadataIndex('metadata_index.json', ttl_hours=24, log=logger)
     gen = Engine(connection_, logger, org_unit_group=org_unit_group_,
                  posted_file_path=post_file_path,
-                 years=processing_years)
+                 years=processing_years,
+                 stream_pull=True,  # read dataValues incrementally (ijson, or dataValueSets.csv when ijson is missing)
+                 pull_batch_size=5000,
+                 debug_snapshots=False,  # True writes intermediate DataFrames as Parquet/CSV for debugging
+                 concurrency={
+                     'pull_workers': 2,  # period windows pulled from the source at the same time
+                     'post_workers': 2,  # batches posted to the destination at the same time
+                     'queue_size': 8  # pulled batches waiting to be posted before the pullers block
+                 },  # None migrates the windows one after another
+                 checkpoint=checkpoint_,
+                 batching={
+                     'initial': 500,  # data values in the first POST
+                     'floor': 100,  # never post fewer values per batch
+                     'ceiling': 5000,  # never post more values per batch
+                     'target_seconds': 10.0  # grow while POSTs are faster than half of this, shrink above it
+                 },
+                 metadata_index=metadata_index_,
+                 conflict_repair={
+                     'every_batches': 10,  # repair once this many batches came back with conflicts
+                     'every_seconds': 300.0  # or once the oldest queued conflict waited this long
+                 },
+                 preflight=True,  # check batches against the destination's metadata and repair before posting
+                 import_mode={
+                     'async': False,  # True imports batches as async jobs polled on system/tasks
+                     'max_in_flight': 4,  # async import jobs running on the destination at the same time
+                     'poll_interval': 5,  # seconds between job status checks
+                     'job_timeout': 3600,  # give up waiting for a job after this many seconds
+                     'post_timeout': 600,  # seconds before a POST is abandoned
+                     'dry_run': False  # True validates the values with dryRun=true without importing them
+                 },
+                 deletion={
+                     'batch_size': 5000,  # dataValues per importStrategy=DELETE post
+                     'workers': 4,  # DELETE posts running at the same time
+                     'count_only': False  # True counts the values that would be deleted, deletes nothing
+                 })
     deletion = False
     maintenance = False  # default is False (False runs the COC configurations)
     specific_push = False
@@ -1596,7 +2716,7 @@ if __name__ == "__main__":
                             #coc_data["shortName"] = category_combination_id
 
                             data_structured = {"categoryCombos": [coc_data]}
-                            data_ = gen.clean_up(str(data_structured))
+                            data_ = gen.serialize(data_structured)
                             response_update = gen.post_data(url=f"{gen.destination_base_url}metadata", data=data_, params={'importStrategy': 'CREATE_AND_UPDATE'})
                             # logger.debug(coc_data)
                             logger.debug('++ Updating CategoryCombo ++ ')
@@ -1611,8 +2731,7 @@ if __name__ == "__main__":
                             renamed_cat_options_combos = gen.update_coc_name(coc_data_update["categoryOptionCombos"],
                                                                              df_coc_)
                             data_structured = {"categoryOptionCombos": renamed_cat_options_combos}
-                            payload = json.dumps(data_structured, ensure_ascii=False).encode('utf-8')
-                            data = gen.clean_up(str(data_structured))
+                            data = gen.serialize(data_structured)
                             # print(data)
                             response_update_ = gen.post_data(url=f"{gen.destination_base_url}metadata", data=data,
                                                             params={'importStrategy': 'CREATE_AND_UPDATE'},
@@ -1640,3 +2759,4 @@ if __name__ == "__main__":
                 fix_errors_.extract_metadata()
         today_date_time = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         logger.debug(f"finished processing at {today_date_time}")
+    checkpoint_.close()
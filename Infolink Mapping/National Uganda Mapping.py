@@ -1,13 +1,26 @@
 import requests
 import pandas as pd
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
 import json
 import re
 import os
+import glob
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from fuzzysearch import find_near_matches
 from dotenv import load_dotenv
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional, parallel workers then receive a pickled copy of the master file
+    feather = None
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -114,9 +127,28 @@ filter_lists = {
     # "OTHER_DATA_ELEMENT": {"filter_key": "filter_value"}
 }
 
+# On-disk cache of detailed category option combos per data element.
+# An entry is reused until the data element or its category combo changes on the server (lastUpdated).
+COC_CACHE_FILE = os.getenv("COC_CACHE_FILE", "coc_cache.json")
+
+# Longest URL sent when fetching category option combos in bulk with filter=id:in:[...]
+MAX_URL_LENGTH = 2000
+
 # Master Excel file to load data from
 MASTER_EXCEL_FILE = "mergedMetaDataV2.xlsx"
 
+# Parsed copies of the master Excel file are cached here as Parquet, keyed by the file's modification time
+MASTER_CACHE_DIR = os.getenv("MAPPING_CACHE_DIR", ".mapping_cache")
+
+# Per data element output file: "parquet", "xlsx" or "none" (results are only kept in memory for the merge)
+PER_ELEMENT_OUTPUT = os.getenv("MAPPING_PER_ELEMENT_OUTPUT", "parquet").lower()
+
+# Export the merged output as xlsx; when disabled it is written as Parquet
+EXPORT_XLSX = os.getenv("MAPPING_EXPORT_XLSX", "true").lower() in ("1", "true", "yes")
+
+# Number of worker processes used to process data elements concurrently (1 = one after another)
+MAPPING_WORKERS = int(os.getenv("MAPPING_WORKERS", "1"))
+
 # Filter mapping dictionary: {data_element_key: {"filter_by": filter_value, "filter_by_coc": optional_coc_value}}
 # Rows will be extracted from the master file based on:
 #   - filter_by: matches values in 'dataElement.name' column (required)
@@ -168,16 +200,34 @@ excel_files = {
     # Add more filter mappings here as needed
 }
 
+_sessions = {}
+
+def get_session(username, password):
+    """
+    Get the shared DHIS2 session for these credentials (pooled keep-alive connections, retries on 429/5xx)
+    """
+    key = (username, password)
+    if key not in _sessions:
+        session = requests.Session()
+        session.auth = HTTPBasicAuth(username, password)
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[key] = session
+    return _sessions[key]
+
 def get_dhis2_data_element(url, username, password, data_element_id):
     """
     Fetch data element details from DHIS2 API
+    Only the COC ids of the category combo are included; their details come from get_all_category_option_combos
+    (bulk fetch, cached on disk)
     """
     endpoint = f"{url}/api/dataElements/{data_element_id}.json"
     try:
-        response = requests.get(
+        response = get_session(username, password).get(
             endpoint,
-            auth=HTTPBasicAuth(username, password),
-            params={"fields": "id,name,categoryCombo[id,name,categoryOptionCombos[id,name,categoryOptions[id,name]]]"}
+            params={"fields": "id,name,lastUpdated,categoryCombo[id,name,lastUpdated,categoryOptionCombos[id]]"}
         )
         response.raise_for_status()
         return response.json()
@@ -282,9 +332,58 @@ def get_data_element_name(url, username, password, data_element_id, de_info_cach
     
     return 'Unknown'
 
+def load_coc_cache():
+    """
+    Load the on-disk COC cache: {data_element_id: {"lastUpdated": ..., "cocs": [...]}}
+    """
+    if not os.path.exists(COC_CACHE_FILE):
+        return {}
+    try:
+        with open(COC_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable COC cache '{COC_CACHE_FILE}': {e}")
+        return {}
+
+def save_coc_cache(data_element_id, last_updated, cocs):
+    """
+    Store the detailed COCs of one data element in the on-disk COC cache
+    """
+    cache = load_coc_cache()
+    cache[data_element_id] = {"lastUpdated": last_updated, "cocs": cocs}
+    # Write to a temporary file first so parallel workers never read a half-written cache
+    tmp_file = f"{COC_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, COC_CACHE_FILE)
+    except OSError as e:
+        print(f"Warning: Could not save COC cache '{COC_CACHE_FILE}': {e}")
+
+def chunk_ids_by_url_length(ids, base_length, max_url_length=MAX_URL_LENGTH):
+    """
+    Split ids into chunks whose id:in:[...] filter keeps the URL under max_url_length
+    """
+    chunks = []
+    chunk = []
+    length = base_length
+    for coc_id in ids:
+        id_length = len(coc_id) + 3  # URL-encoded comma separator
+        if chunk and length + id_length > max_url_length:
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+        chunk.append(coc_id)
+        length += id_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
 def get_all_category_option_combos(url, username, password, data_element_id):
     """
     Get all category option combinations for a data element
+    COC details are fetched in bulk (filter=id:in:[...], chunked by URL length) and cached on disk
+    until the data element or its category combo is updated on the server
     """
     # First get the data element to find its category combo
     data_element = get_dhis2_data_element(url, username, password, data_element_id)
@@ -295,26 +394,37 @@ def get_all_category_option_combos(url, username, password, data_element_id):
     category_combo = data_element.get('categoryCombo', {})
     category_option_combos = category_combo.get('categoryOptionCombos', [])
     
-    # If we need more details about each COC, fetch them individually
-    detailed_cocs = []
-    for coc in category_option_combos:
-        coc_id = coc.get('id')
-        if coc_id:
-            # Fetch detailed COC information
-            endpoint = f"{url}/api/categoryOptionCombos/{coc_id}.json"
-            try:
-                response = requests.get(
-                    endpoint,
-                    auth=HTTPBasicAuth(username, password),
-                    params={"fields": "id,name,categoryOptions[id,name]"}
-                )
-                response.raise_for_status()
-                detailed_coc = response.json()
-                detailed_cocs.append(detailed_coc)
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching COC {coc_id}: {e}")
-                # Use basic info if detailed fetch fails
-                detailed_cocs.append(coc)
+    # Reuse the cached COCs if nothing changed on the server since they were fetched
+    last_updated = f"{data_element.get('lastUpdated')}|{category_combo.get('lastUpdated')}"
+    cached = load_coc_cache().get(data_element_id)
+    if cached and cached.get('lastUpdated') == last_updated:
+        print(f"Using {len(cached['cocs'])} category option combinations from {COC_CACHE_FILE}")
+        return cached['cocs']
+    
+    # Fetch the details of all COCs in as few requests as the URL length allows
+    endpoint = f"{url}/api/categoryOptionCombos.json"
+    fields = "id,name,categoryOptions[id,name]"
+    base_length = len(endpoint) + len(f"?fields={fields}&paging=false&filter=id:in:[]") + 20
+    coc_ids = [coc.get('id') for coc in category_option_combos if coc.get('id')]
+    detailed_by_id = {}
+    fetch_failed = False
+    for chunk in chunk_ids_by_url_length(coc_ids, base_length):
+        try:
+            response = get_session(username, password).get(
+                endpoint,
+                params={"filter": f"id:in:[{','.join(chunk)}]", "fields": fields, "paging": "false"}
+            )
+            response.raise_for_status()
+            for detailed_coc in response.json().get('categoryOptionCombos', []):
+                detailed_by_id[detailed_coc.get('id')] = detailed_coc
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {len(chunk)} COCs: {e}")
+            fetch_failed = True
+    
+    # Keep the category combo order; a COC whose details could not be fetched only has its id
+    detailed_cocs = [detailed_by_id.get(coc.get('id'), coc) for coc in category_option_combos if coc.get('id')]
+    if not fetch_failed:
+        save_coc_cache(data_element_id, last_updated, detailed_cocs)
     
     return detailed_cocs
 
@@ -478,64 +588,75 @@ def extract_key_components(s):
     
     return components
 
-def fuzzy_match_category_option_combo(excel_value, coc_list):
+class CategoryOptionComboMatcher:
     """
-    Use fuzzy matching to find the best matching category option combo using fuzzysearch
-    The Excel value (e.g., "5-9Yrs, Female") should match COC names (e.g., "General Population, Female, 5-9 Years, CD4: <200")
-    Returns: (matched_name, matched_id, match_score)
+    Fuzzy matcher for the category option combos of one data element
+    COC names are normalized and their components extracted once, and the COCs are bucketed by
+    (age_range, gender) so each Excel value is only scored against the COCs it can match.
+    Results are memoized by Excel value since the master file repeats the same values a lot.
     """
-    if pd.isna(excel_value) or excel_value == '':
-        return None, None, 0.0
-    
-    excel_value_str = str(excel_value).strip()
-    excel_normalized = normalize_string(excel_value_str)
-    excel_components = extract_key_components(excel_value_str)
-    
-    # Create a list of COC names for matching
-    coc_names = [coc.get('name', '') for coc in coc_list]
-    
-    if not coc_names:
-        return None, None, 0.0
-    
-    # Use fuzzysearch to find the best match
-    best_match = None
-    best_score = 0.0
-    max_l_dist = 5  # Maximum Levenshtein distance allowed
-    
-    for coc_name in coc_names:
-        if not coc_name:
-            continue
-        
-        coc_normalized = normalize_string(coc_name)
-        coc_components = extract_key_components(coc_name)
-        
-        # CRITICAL: First check if key components match - age range and gender must match
-        # If age range is specified in Excel, it must match in COC
-        if excel_components['age_range']:
-            if coc_components['age_range'] != excel_components['age_range']:
-                continue  # Skip this COC if age range doesn't match
-        
-        # If gender is specified in Excel, it must match in COC
-        if excel_components['gender']:
-            if coc_components['gender'] != excel_components['gender']:
-                continue  # Skip this COC if gender doesn't match
+    MAX_L_DIST = 5  # Maximum Levenshtein distance allowed
+    MIN_SCORE = 0.5  # Minimum threshold of 50%
+
+    def __init__(self, coc_list):
+        self.candidates = []
+        self.by_age_gender = {}
+        self.by_age = {}
+        self.by_gender = {}
+        self.cache = {}
+        coc_by_name = {}
+        for coc in coc_list:
+            coc_name = coc.get('name', '')
+            if not coc_name:
+                continue
+            # Same name, same score: the first COC with a name is the one returned for it
+            if coc_name in coc_by_name:
+                continue
+            coc_by_name[coc_name] = coc
+            coc_normalized = normalize_string(coc_name)
+            components = extract_key_components(coc_name)
+            candidate = (coc, coc_normalized, set(coc_normalized.split()))
+            self.candidates.append(candidate)
+            # Buckets keep the COC list order so ties resolve to the same COC as a full scan
+            self.by_age_gender.setdefault((components['age_range'], components['gender']), []).append(candidate)
+            self.by_age.setdefault(components['age_range'], []).append(candidate)
+            self.by_gender.setdefault(components['gender'], []).append(candidate)
+
+    def candidates_for(self, components):
+        """
+        COCs whose age range and gender agree with the ones specified in the Excel value
+        """
+        age_range = components['age_range']
+        gender = components['gender']
+        if age_range and gender:
+            return self.by_age_gender.get((age_range, gender), [])
+        if age_range:
+            return self.by_age.get(age_range, [])
+        if gender:
+            return self.by_gender.get(gender, [])
+        return self.candidates
+
+    @classmethod
+    def score(cls, excel_normalized, excel_words, coc_normalized, coc_words):
+        """
+        Similarity score between a normalized Excel value and a normalized COC name
+        """
+        # Method 4: Exact match (case-insensitive) always wins
+        if excel_normalized == coc_normalized:
+            return 1.0
         
-        # If we get here, key components match - now calculate similarity score
         score = 0.0
         
         # Method 1: Check for exact substring match (normalized)
         if excel_normalized in coc_normalized:
-            # If the normalized Excel value is contained in the normalized COC name
-            shorter = len(excel_normalized)
-            longer = len(coc_normalized)
             # High score for substring match
             score = max(score, 0.9)
         
-        # Method 2: Try to find excel_value_str as a substring in coc_name (normalized) using fuzzy search
+        # Method 2: Try to find the Excel value as a substring in the COC name using fuzzy search
         matches_in_coc = find_near_matches(
             excel_normalized,
             coc_normalized,
-            max_l_dist=max_l_dist
+            max_l_dist=cls.MAX_L_DIST
         )
         
         if matches_in_coc:
@@ -547,29 +668,108 @@ def fuzzy_match_category_option_combo(excel_value, coc_list):
             score = max(score, match_score * 0.85)
         
         # Method 3: Word-based matching - check if key words from Excel are in COC
-        excel_words = set(excel_normalized.split())
-        coc_words = set(coc_normalized.split())
         if excel_words:
             common_words = excel_words.intersection(coc_words)
             word_score = len(common_words) / len(excel_words)
             score = max(score, word_score * 0.7)
         
-        # Method 4: Exact match (case-insensitive)
-        if excel_normalized == coc_normalized:
-            score = 1.0
+        return score
+
+    def match(self, excel_value):
+        """
+        Find the best matching category option combo for an Excel value
+        Returns: (matched_name, matched_id, match_score)
+        """
+        if pd.isna(excel_value) or excel_value == '':
+            return None, None, 0.0
         
-        # Update best match if this score is better
-        if score > best_score:
-            best_score = score
-            best_match = coc_name
-    
-    # Only return a match if score is above threshold
-    if best_match and best_score >= 0.5:  # Minimum threshold of 50%
-        matched_coc = next((coc for coc in coc_list if coc.get('name') == best_match), None)
-        if matched_coc:
-            return matched_coc.get('name'), matched_coc.get('id'), round(best_score, 3)
+        excel_value_str = str(excel_value).strip()
+        if excel_value_str in self.cache:
+            return self.cache[excel_value_str]
+        
+        excel_normalized = normalize_string(excel_value_str)
+        excel_words = set(excel_normalized.split())
+        # CRITICAL: age range and gender specified in the Excel value must match in the COC
+        candidates = self.candidates_for(extract_key_components(excel_value_str))
+        
+        best_match = None
+        best_score = 0.0
+        for coc, coc_normalized, coc_words in candidates:
+            score = self.score(excel_normalized, excel_words, coc_normalized, coc_words)
+            # Update best match if this score is better
+            if score > best_score:
+                best_score = score
+                best_match = coc
+        
+        # Only return a match if score is above threshold
+        if best_match and best_score >= self.MIN_SCORE:
+            result = best_match.get('name'), best_match.get('id'), round(best_score, 3)
+        else:
+            result = None, None, round(best_score, 3) if best_score > 0 else 0.0
+        self.cache[excel_value_str] = result
+        return result
+
+    def match_many(self, excel_values):
+        """
+        Match a batch of (unique) Excel values
+        Returns: {excel_value: (matched_name, matched_id, match_score)}
+        """
+        return {excel_value: self.match(excel_value) for excel_value in excel_values}
+
+def fuzzy_match_category_option_combo(excel_value, coc_list):
+    """
+    Use fuzzy matching to find the best matching category option combo using fuzzysearch
+    The Excel value (e.g., "5-9Yrs, Female") should match COC names (e.g., "General Population, Female, 5-9 Years, CD4: <200")
+    Builds a one-off CategoryOptionComboMatcher; when matching many values build the matcher once instead
+    Returns: (matched_name, matched_id, match_score)
+    """
+    return CategoryOptionComboMatcher(coc_list).match(excel_value)
+
+def save_output(df, base_name, output_format):
+    """
+    Write a DataFrame as base_name.parquet or base_name.xlsx
+    Falls back to xlsx when the data can not be written as Parquet (e.g. pyarrow is not installed)
+    Returns the name of the file written
+    """
+    if output_format == 'parquet':
+        try:
+            df.to_parquet(f"{base_name}.parquet", index=False)
+            return f"{base_name}.parquet"
+        except Exception as e:
+            print(f"Warning: Could not write '{base_name}.parquet' ({e}), writing xlsx instead")
+    df.to_excel(f"{base_name}.xlsx", index=False)
+    return f"{base_name}.xlsx"
+
+def load_master_file():
+    """
+    Load the master Excel file, using the Parquet copy in MASTER_CACHE_DIR if the Excel file did not change since
+    """
+    stat = os.stat(MASTER_EXCEL_FILE)
+    base_name = os.path.splitext(os.path.basename(MASTER_EXCEL_FILE))[0]
+    cache_file = os.path.join(MASTER_CACHE_DIR, f"{base_name}_{stat.st_mtime_ns}_{stat.st_size}.parquet")
+    if os.path.exists(cache_file):
+        try:
+            master_df = pd.read_parquet(cache_file)
+            print(f"\nMaster file loaded from cache: {cache_file}")
+            return master_df
+        except Exception as e:
+            print(f"Warning: Could not read master cache '{cache_file}': {e}")
     
-    return None, None, round(best_score, 3) if best_score > 0 else 0.0
+    master_df = pd.read_excel(MASTER_EXCEL_FILE)
+    print(f"\nMaster file loaded: {MASTER_EXCEL_FILE}")
+    try:
+        os.makedirs(MASTER_CACHE_DIR, exist_ok=True)
+        # Drop caches of older versions of the Excel file, only <base_name>_<mtime>_<size>.parquet so caches of
+        # other master files sharing the prefix (e.g. master vs master_2024) are kept
+        stale_pattern = re.compile(rf"{re.escape(base_name)}_\d+_\d+\.parquet")
+        for stale_file in glob.glob(os.path.join(MASTER_CACHE_DIR, f"{glob.escape(base_name)}_*.parquet")):
+            if stale_pattern.fullmatch(os.path.basename(stale_file)):
+                os.remove(stale_file)
+        master_df.to_parquet(cache_file, index=False)
+        print(f"  Cached as: {cache_file}")
+    except Exception as e:
+        print(f"Warning: Could not cache master file as Parquet: {e}")
+    return master_df
 
 def process_data_element(de_key, de_id, filter_dict, df, cocs_cache=None):
     """
@@ -694,53 +894,249 @@ def process_data_element(de_key, de_id, filter_dict, df, cocs_cache=None):
     
     # Perform fuzzy matching for each row
     print("\nPerforming fuzzy matching...")
-    matched_names = []
-    matched_ids = []
-    match_scores = []
-    
-    for idx, row in df.iterrows():
-        excel_coc_name = row.get('categoryOptionCombos.name', '')
-        matched_name, matched_id, match_score = fuzzy_match_category_option_combo(excel_coc_name, unique_cocs)
-        matched_names.append(matched_name)
-        matched_ids.append(matched_id)
-        match_scores.append(match_score)
-        
-        if idx < 5:  # Show first 5 matches
-            print(f"Row {idx}: '{excel_coc_name}' -> '{matched_name}' (ID: {matched_id}, Score: {match_score})")
-    
-    # Add new columns to the dataframe
-    # Note: matched_names will have YYY/XXX replacements, let's also add original names
-    matched_original_names = []
-    for matched_name in matched_names:
-        if matched_name:
-            # Find the original name from unique_cocs
-            matched_coc = next((coc for coc in unique_cocs if coc.get('name') == matched_name), None)
-            if matched_coc and matched_coc.get('original_name'):
-                matched_original_names.append(matched_coc.get('original_name'))
-            else:
-                matched_original_names.append(matched_name)
-        else:
-            matched_original_names.append(None)
+    matcher = CategoryOptionComboMatcher(unique_cocs)
     
+    # Match each distinct Excel value once and map the results back onto the rows
+    if 'categoryOptionCombos.name' in df.columns:
+        excel_values = df['categoryOptionCombos.name']
+    else:
+        excel_values = pd.Series('', index=df.index)
+    matches = matcher.match_many(excel_values.unique())
+    
+    # Matched names have YYY/XXX replacements, also map them back to the original names
+    original_names = {}
+    for coc in unique_cocs:
+        original_names.setdefault(coc.get('name'), coc.get('original_name') or coc.get('name'))
+    
+    matched_names = excel_values.map({value: match[0] for value, match in matches.items()})
     df['infolink_categoryOptionCombos_name'] = matched_names  # With YYY/XXX
-    df['infolink_categoryOptionCombos_name_original'] = matched_original_names  # Original with Male/Female
-    df['infolink_categoryOptionCombos_id'] = matched_ids
-    df['infolink_match_score'] = match_scores
+    df['infolink_categoryOptionCombos_name_original'] = matched_names.map(original_names)  # Original with Male/Female
+    df['infolink_categoryOptionCombos_id'] = excel_values.map({value: match[1] for value, match in matches.items()})
+    df['infolink_match_score'] = excel_values.map({value: match[2] for value, match in matches.items()})
+    
+    for excel_coc_name in excel_values.iloc[:5]:  # Show first 5 matches
+        matched_name, matched_id, match_score = matches[excel_coc_name]
+        print(f"'{excel_coc_name}' -> '{matched_name}' (ID: {matched_id}, Score: {match_score})")
+    print(f"Matched {len(matches)} distinct values for {len(df)} rows")
     
-    # Save the updated Excel file (named by data element key)
-    output_file = f"{de_key}_output.xlsx"
-    print(f"\nSaving updated file to: {output_file}")
-    df.to_excel(output_file, index=False)
-    print("File saved successfully!")
+    # Save the updated data (named by data element key)
+    if PER_ELEMENT_OUTPUT != 'none':
+        output_file = save_output(df, f"{de_key}_output", PER_ELEMENT_OUTPUT)
+        print(f"\nSaved updated file to: {output_file}")
     
     # Print summary statistics
-    matched_count = sum(1 for x in matched_names if x is not None)
+    matched_count = int(matched_names.notna().sum())
     print(f"\nSummary for {de_key}:")
     print(f"  Total rows: {len(df)}")
     print(f"  Successfully matched: {matched_count}")
     print(f"  Unmatched: {len(df) - matched_count}")
     
-    return matched_count, len(df)
+    return matched_count, len(df), df
+
+def find_filter_column(columns):
+    """
+    Find the data element name column of the master file to filter on
+    Use 'dataElement.name' as the filter column (NOT 'dataElement.id')
+    """
+    filter_column = 'dataElement.name'
+    if filter_column not in columns:
+        # Try to find a similar column - must contain 'name' and NOT 'id'
+        possible_columns = [
+            col for col in columns 
+            if 'dataelement' in col.lower() and 'name' in col.lower() and 'id' not in col.lower()
+        ]
+        if not possible_columns:
+            # Try broader search - still excluding 'id'
+            possible_columns = [
+                col for col in columns 
+                if ('dataelement' in col.lower() or ('data' in col.lower() and 'element' in col.lower())) 
+                and 'name' in col.lower() 
+                and 'id' not in col.lower()
+            ]
+        if possible_columns:
+            filter_column = possible_columns[0]
+            print(f"  Using column '{filter_column}' instead of 'dataElement.name'")
+        else:
+            raise ValueError(f"Could not find filter column 'dataElement.name' in master file. Available columns: {', '.join(columns)}")
+    
+    # Verify we're not accidentally using dataElement.id
+    if 'id' in filter_column.lower() and 'name' not in filter_column.lower():
+        raise ValueError(f"Error: Filter column '{filter_column}' appears to be an ID column, not a name column. Please use 'dataElement.name'.")
+    return filter_column
+
+def select_master_rows(de_key, master_df):
+    """
+    Extract the master file rows of a data element using its excel_files filter configuration
+    Returns the filtered DataFrame, or None when no rows match
+    """
+    file_config = excel_files.get(de_key, {})
+    filter_by_value = file_config.get('filter_by')
+    filter_by_coc = file_config.get('filter_by_coc')  # Optional filter for categoryOptionCombos.name
+    
+    # Filter rows from master file based on filter_by value
+    filter_column = find_filter_column(master_df.columns.tolist())
+    
+    print(f"\nFiltering master file for '{de_key}'...")
+    # Step 1: Filter rows where dataElement.name starts with the filter_by value
+    # (e.g., "106a-HC28a_2019" matches "106a-HC28a_2019. ART patients...")
+    filtered_df = master_df[master_df[filter_column].astype(str).str.startswith(str(filter_by_value))].copy()
+    print(f"  Step 1 - Filter by '{filter_by_value}' in '{filter_column}': {len(filtered_df)} rows")
+    
+    # Step 2: Apply optional filter on categoryOptionCombos.name if specified
+    if filter_by_coc and len(filtered_df) > 0:
+        coc_column = 'categoryOptionCombos.name'
+        if coc_column not in filtered_df.columns:
+            # Try to find a similar column
+            possible_coc_columns = [
+                col for col in filtered_df.columns 
+                if 'categoryoptioncombo' in col.lower() and 'name' in col.lower()
+            ]
+            if possible_coc_columns:
+                coc_column = possible_coc_columns[0]
+                print(f"  Using column '{coc_column}' instead of 'categoryOptionCombos.name'")
+            else:
+                print(f"  Warning: Column 'categoryOptionCombos.name' not found. Available columns: {', '.join(filtered_df.columns.tolist()[:10])}")
+                print(f"  Skipping filter_by_coc filter.")
+                filter_by_coc = None
+        
+        if filter_by_coc:
+            before_count = len(filtered_df)
+            filter_value_lower = str(filter_by_coc).strip().lower()
+            
+            # Filter where categoryOptionCombos.name matches the filter_by_coc value (case-insensitive)
+            # Strategy: Try exact match first, then word-boundary match to avoid partial matches
+            # (e.g., "Assisted HIVST" should NOT match "Unassisted HIVST")
+            
+            # Step 1: Try exact match (after stripping whitespace)
+            mask = filtered_df[coc_column].astype(str).str.strip().str.lower() == filter_value_lower
+            
+            if mask.sum() == 0:
+                # Step 2: Try word-boundary match (prevents "Assisted" matching "Unassisted")
+                # Escape special regex characters in the filter value, but preserve spaces
+                escaped_filter = re.escape(filter_value_lower)
+                # Replace escaped spaces with pattern that allows word boundaries around the phrase
+                # This ensures "Assisted HIVST" matches as a phrase but not "Unassisted HIVST"
+                escaped_filter = escaped_filter.replace(r'\ ', r'\s+')
+                # Use word boundaries at start and end, and allow spaces within
+                pattern = r'(?<!\w)' + escaped_filter + r'(?!\w)'
+                mask = filtered_df[coc_column].astype(str).str.lower().str.contains(pattern, regex=True, na=False)
+            
+            if mask.sum() == 0:
+                # Step 3: As last resort, try simple contains but log a warning
+                print(f"  Warning: No exact or word-boundary match found for '{filter_by_coc}', trying partial match...")
+                mask = filtered_df[coc_column].astype(str).str.lower().str.contains(filter_value_lower, na=False)
+            
+            filtered_df = filtered_df[mask].copy()
+            after_count = len(filtered_df)
+            print(f"  Step 2 - Filter by '{filter_by_coc}' in '{coc_column}': {before_count} -> {after_count} rows")
+    
+    print(f"  Final filtered rows: {len(filtered_df)}")
+    
+    # Show sample values for debugging if no matches found
+    if len(filtered_df) == 0:
+        if filter_by_coc:
+            # Check if first filter worked
+            temp_df = master_df[master_df[filter_column].astype(str).str.startswith(str(filter_by_value))].copy()
+            if len(temp_df) > 0:
+                print(f"  Warning: No rows found after applying both filters.")
+                if 'categoryOptionCombos.name' in temp_df.columns:
+                    sample_values = temp_df['categoryOptionCombos.name'].astype(str).unique()[:5]
+                    print(f"  Sample values in 'categoryOptionCombos.name': {sample_values.tolist()}")
+            else:
+                sample_values = master_df[filter_column].astype(str).unique()[:5]
+                print(f"  Sample values in '{filter_column}' column: {sample_values.tolist()}")
+        else:
+            sample_values = master_df[filter_column].astype(str).unique()[:5]
+            print(f"  Sample values in '{filter_column}' column: {sample_values.tolist()}")
+    
+    if len(filtered_df) == 0:
+        print(f"  Warning: No rows found matching filter criteria. Skipping...")
+        return None
+    
+    return filtered_df
+
+_shared_masters = {}
+
+def share_master_df(master_df):
+    """
+    Write the master DataFrame to a temporary Feather (Arrow) file that worker processes memory-map read-only
+    Returns the file path, or None if pyarrow is not installed or the data can not be converted
+    """
+    if feather is None:
+        return None
+    fd, path = tempfile.mkstemp(suffix='.feather', prefix='master_')
+    os.close(fd)
+    try:
+        feather.write_feather(master_df.reset_index(drop=True), path, compression='uncompressed')
+        return path
+    except Exception as e:
+        print(f"Warning: Could not share master file as Arrow ({e}), workers will receive a copy")
+        os.remove(path)
+        return None
+
+def load_shared_master(master_source, de_key):
+    """
+    Get the master rows of a data element from a DataFrame or from a Feather file written by share_master_df
+    The Feather file is memory-mapped once per worker process and only the rows whose data element name starts
+    with the filter_by value are converted to pandas, so workers never hold a private copy of the whole master
+    """
+    if isinstance(master_source, pd.DataFrame):
+        return master_source
+    if master_source not in _shared_masters:
+        _shared_masters[master_source] = feather.read_table(master_source, memory_map=True)
+    table = _shared_masters[master_source]
+    filter_by_value = str(excel_files.get(de_key, {}).get('filter_by'))
+    filter_column = find_filter_column(table.column_names)
+    mask = pc.starts_with(table[filter_column].cast(pa.string()), filter_by_value)
+    return table.filter(pc.fill_null(mask, False)).to_pandas()
+
+def run_data_element(de_key, de_id, filter_dict, master_source, cocs_cache=None):
+    """
+    Select the master file rows of a data element and process them (also the worker process entry point)
+    Returns (matched, rows, result DataFrame), or None when the data element was skipped or failed
+    """
+    try:
+        master_df = load_shared_master(master_source, de_key)
+        filtered_df = select_master_rows(de_key, master_df)
+        if filtered_df is None:
+            return None
+        return process_data_element(de_key, de_id, filter_dict, filtered_df, cocs_cache)
+    except Exception as e:
+        print(f"\nError processing data element '{de_key}': {e}")
+        traceback.print_exc()
+        return None
+
+def process_data_elements_parallel(jobs, master_df, workers, cocs_cache):
+    """
+    Process independent data elements in a pool of worker processes
+    COCs are fetched once per data element ID up front so workers sharing an ID do not fetch them again.
+    Returns the results in the same order as jobs
+    """
+    print(f"\nProcessing {len(jobs)} data element(s) with {workers} worker processes...")
+    for de_id in dict.fromkeys(de_id for _, de_id, _ in jobs):
+        if de_id not in cocs_cache:
+            cocs_cache[de_id] = get_all_category_option_combos(dhis2_url, username, password, de_id)
+    
+    master_path = share_master_df(master_df)
+    master_source = master_path if master_path else master_df
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_data_element, de_key, de_id, filter_dict, master_source,
+                                {de_id: cocs_cache[de_id]})
+                for de_key, de_id, filter_dict in jobs
+            ]
+            results = []
+            for (de_key, _, _), future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"\nError processing data element '{de_key}': {e}")
+                    results.append(None)
+            return results
+    finally:
+        if master_path:
+            os.remove(master_path)
 
 def main():
     """
@@ -759,7 +1155,7 @@ def main():
     
     total_matched = 0
     total_rows = 0
-    processed_output_files = []  # Track successfully processed output files
+    processed_results = []  # (de_key, result DataFrame) of successfully processed data elements
     cocs_cache = {}  # Cache to store COCs by de_id to avoid duplicate API calls
     de_info_cache = {}  # Cache to store data element info (name, etc.) by de_id
     
@@ -780,11 +1176,8 @@ def main():
             print(f"Note: Multiple data element IDs found: {unique_de_ids}")
             print(f"Using name from first ID: {primary_de_id}")
     
-    # Load master file once (cache it for reuse)
-    master_df = None
-    master_file_loaded = False
-    
-    # Process each data element separately
+    # Keep the data elements that have a valid filter configuration, in dataElements order
+    jobs = []
     for de_key, de_id in dataElements.items():
         # Get filter for this data element
         filter_dict = filter_lists.get(de_key, {})
@@ -795,189 +1188,78 @@ def main():
             print(f"\nWarning: Invalid configuration for data element '{de_key}'. Skipping...")
             continue
         
-        filter_by_value = file_config.get('filter_by')
-        filter_by_coc = file_config.get('filter_by_coc')  # Optional filter for categoryOptionCombos.name
-        
-        if not filter_by_value:
+        if not file_config.get('filter_by'):
             print(f"\nWarning: No 'filter_by' value specified for data element '{de_key}'. Skipping...")
             continue
         
+        jobs.append((de_key, de_id, filter_dict))
+    
+    # Load master file once (shared by all data elements)
+    master_df = None
+    if jobs:
         try:
-            # Load master file if not already loaded
-            if not master_file_loaded:
-                master_df = pd.read_excel(MASTER_EXCEL_FILE)
-                master_file_loaded = True
-                print(f"\nMaster file loaded: {MASTER_EXCEL_FILE}")
-                print(f"  Total rows in master file: {len(master_df)}")
-            
-            # Filter rows from master file based on filter_by value
-            # Use 'dataElement.name' as the filter column (NOT 'dataElement.id')
-            filter_column = 'dataElement.name'
-            if filter_column not in master_df.columns:
-                # Try to find a similar column - must contain 'name' and NOT 'id'
-                possible_columns = [
-                    col for col in master_df.columns 
-                    if 'dataelement' in col.lower() and 'name' in col.lower() and 'id' not in col.lower()
-                ]
-                if not possible_columns:
-                    # Try broader search - still excluding 'id'
-                    possible_columns = [
-                        col for col in master_df.columns 
-                        if ('dataelement' in col.lower() or ('data' in col.lower() and 'element' in col.lower())) 
-                        and 'name' in col.lower() 
-                        and 'id' not in col.lower()
-                    ]
-                if possible_columns:
-                    filter_column = possible_columns[0]
-                    print(f"  Using column '{filter_column}' instead of 'dataElement.name'")
-                else:
-                    raise ValueError(f"Could not find filter column 'dataElement.name' in master file. Available columns: {', '.join(master_df.columns.tolist())}")
-            
-            # Verify we're not accidentally using dataElement.id
-            if 'id' in filter_column.lower() and 'name' not in filter_column.lower():
-                raise ValueError(f"Error: Filter column '{filter_column}' appears to be an ID column, not a name column. Please use 'dataElement.name'.")
-            
-            print(f"\nFiltering master file for '{de_key}'...")
-            # Step 1: Filter rows where dataElement.name starts with the filter_by value
-            # (e.g., "106a-HC28a_2019" matches "106a-HC28a_2019. ART patients...")
-            filtered_df = master_df[master_df[filter_column].astype(str).str.startswith(str(filter_by_value))].copy()
-            print(f"  Step 1 - Filter by '{filter_by_value}' in '{filter_column}': {len(filtered_df)} rows")
-            
-            # Step 2: Apply optional filter on categoryOptionCombos.name if specified
-            if filter_by_coc and len(filtered_df) > 0:
-                coc_column = 'categoryOptionCombos.name'
-                if coc_column not in filtered_df.columns:
-                    # Try to find a similar column
-                    possible_coc_columns = [
-                        col for col in filtered_df.columns 
-                        if 'categoryoptioncombo' in col.lower() and 'name' in col.lower()
-                    ]
-                    if possible_coc_columns:
-                        coc_column = possible_coc_columns[0]
-                        print(f"  Using column '{coc_column}' instead of 'categoryOptionCombos.name'")
-                    else:
-                        print(f"  Warning: Column 'categoryOptionCombos.name' not found. Available columns: {', '.join(filtered_df.columns.tolist()[:10])}")
-                        print(f"  Skipping filter_by_coc filter.")
-                        filter_by_coc = None
-                
-                if filter_by_coc:
-                    before_count = len(filtered_df)
-                    filter_value_lower = str(filter_by_coc).strip().lower()
-                    
-                    # Filter where categoryOptionCombos.name matches the filter_by_coc value (case-insensitive)
-                    # Strategy: Try exact match first, then word-boundary match to avoid partial matches
-                    # (e.g., "Assisted HIVST" should NOT match "Unassisted HIVST")
-                    
-                    # Step 1: Try exact match (after stripping whitespace)
-                    mask = filtered_df[coc_column].astype(str).str.strip().str.lower() == filter_value_lower
-                    
-                    if mask.sum() == 0:
-                        # Step 2: Try word-boundary match (prevents "Assisted" matching "Unassisted")
-                        # Escape special regex characters in the filter value, but preserve spaces
-                        escaped_filter = re.escape(filter_value_lower)
-                        # Replace escaped spaces with pattern that allows word boundaries around the phrase
-                        # This ensures "Assisted HIVST" matches as a phrase but not "Unassisted HIVST"
-                        escaped_filter = escaped_filter.replace(r'\ ', r'\s+')
-                        # Use word boundaries at start and end, and allow spaces within
-                        pattern = r'(?<!\w)' + escaped_filter + r'(?!\w)'
-                        mask = filtered_df[coc_column].astype(str).str.lower().str.contains(pattern, regex=True, na=False)
-                    
-                    if mask.sum() == 0:
-                        # Step 3: As last resort, try simple contains but log a warning
-                        print(f"  Warning: No exact or word-boundary match found for '{filter_by_coc}', trying partial match...")
-                        mask = filtered_df[coc_column].astype(str).str.lower().str.contains(filter_value_lower, na=False)
-                    
-                    filtered_df = filtered_df[mask].copy()
-                    after_count = len(filtered_df)
-                    print(f"  Step 2 - Filter by '{filter_by_coc}' in '{coc_column}': {before_count} -> {after_count} rows")
-            
-            print(f"  Final filtered rows: {len(filtered_df)}")
-            
-            # Show sample values for debugging if no matches found
-            if len(filtered_df) == 0:
-                if filter_by_coc:
-                    # Check if first filter worked
-                    temp_df = master_df[master_df[filter_column].astype(str).str.startswith(str(filter_by_value))].copy()
-                    if len(temp_df) > 0:
-                        print(f"  Warning: No rows found after applying both filters.")
-                        if 'categoryOptionCombos.name' in temp_df.columns:
-                            sample_values = temp_df['categoryOptionCombos.name'].astype(str).unique()[:5]
-                            print(f"  Sample values in 'categoryOptionCombos.name': {sample_values.tolist()}")
-                    else:
-                        sample_values = master_df[filter_column].astype(str).unique()[:5]
-                        print(f"  Sample values in '{filter_column}' column: {sample_values.tolist()}")
-                else:
-                    sample_values = master_df[filter_column].astype(str).unique()[:5]
-                    print(f"  Sample values in '{filter_column}' column: {sample_values.tolist()}")
-            
-            if len(filtered_df) == 0:
-                print(f"  Warning: No rows found matching filter criteria. Skipping...")
-                continue
-            
-            # Process the filtered dataframe
-            matched, rows = process_data_element(de_key, de_id, filter_dict, filtered_df, cocs_cache)
-            total_matched += matched
-            total_rows += rows
-            # Track the output file name for merging
-            output_file = f"{de_key}_output.xlsx"
-            processed_output_files.append((de_key, output_file))
+            master_df = load_master_file()
+            print(f"  Total rows in master file: {len(master_df)}")
         except FileNotFoundError as e:
             print(f"\nError: {e}")
-        except Exception as e:
-            print(f"\nError processing data element '{de_key}': {e}")
-            import traceback
-            traceback.print_exc()
+            jobs = []
     
-    # Merge all output files into one combined file
+    # Process the data elements, results are kept in dataElements order
+    workers = max(1, MAPPING_WORKERS)
+    if workers > 1 and len(jobs) > 1:
+        results = process_data_elements_parallel(jobs, master_df, workers, cocs_cache)
+    else:
+        results = [
+            run_data_element(de_key, de_id, filter_dict, master_df, cocs_cache)
+            for de_key, de_id, filter_dict in jobs
+        ]
+    
+    for (de_key, de_id, filter_dict), result in zip(jobs, results):
+        if result is None:
+            continue
+        matched, rows, result_df = result
+        total_matched += matched
+        total_rows += rows
+        # Keep the result for merging
+        processed_results.append((de_key, result_df))
+    
+    # Merge all results into one combined file
     merged_dataframes = []
     merged_filename = None
-    if processed_output_files:
+    if processed_results:
         print(f"\n{'='*80}")
-        print("Merging all output files into one combined file...")
+        print("Merging all results into one combined file...")
         print(f"{'='*80}")
         
-        for de_key, output_file in processed_output_files:
-            try:
-                df = pd.read_excel(output_file)
-                # Add a column to identify the data element source
-                df['data_element_key'] = de_key
-                # Reorder columns to put data_element_key first (after existing key columns if any)
-                cols = df.columns.tolist()
-                # Move data_element_key to near the beginning
-                if 'data_element_key' in cols:
-                    cols.remove('data_element_key')
-                    # Insert after Dataset or at the beginning
-                    if 'Dataset' in cols:
-                        dataset_idx = cols.index('Dataset')
-                        cols.insert(dataset_idx + 1, 'data_element_key')
-                    else:
-                        cols.insert(0, 'data_element_key')
-                    df = df[cols]
-                merged_dataframes.append(df)
-                print(f"  Added {len(df)} rows from {output_file}")
-            except FileNotFoundError:
-                print(f"  Warning: Output file '{output_file}' not found. Skipping...")
-            except Exception as e:
-                print(f"  Warning: Error reading '{output_file}': {e}. Skipping...")
-        
-        if merged_dataframes:
-            # Concatenate all dataframes
-            merged_df = pd.concat(merged_dataframes, ignore_index=True)
-            
-            # Save merged file with dynamic data element name
-            if data_element_name:
-                sanitized_name = sanitize_filename(data_element_name)
-                merged_filename = f"{sanitized_name}_all_data_elements_merged_output.xlsx"
+        for de_key, df in processed_results:
+            # Add a column to identify the data element source
+            df = df.assign(data_element_key=de_key)
+            # Reorder columns to put data_element_key first (after existing key columns if any)
+            cols = df.columns.tolist()
+            cols.remove('data_element_key')
+            # Insert after Dataset or at the beginning
+            if 'Dataset' in cols:
+                dataset_idx = cols.index('Dataset')
+                cols.insert(dataset_idx + 1, 'data_element_key')
             else:
-                merged_filename = "all_data_elements_merged_output.xlsx"
-            
-            merged_df.to_excel(merged_filename, index=False)
-            print(f"\nMerged file saved: {merged_filename}")
-            print(f"  Total rows in merged file: {len(merged_df)}")
-            print(f"  Total columns: {len(merged_df.columns)}")
-            print(f"  Data elements included: {', '.join(set(merged_df['data_element_key'].unique()))}")
+                cols.insert(0, 'data_element_key')
+            merged_dataframes.append(df[cols])
+            print(f"  Added {len(df)} rows from {de_key}")
+        
+        # Concatenate all dataframes
+        merged_df = pd.concat(merged_dataframes, ignore_index=True)
+        
+        # Save merged file with dynamic data element name
+        if data_element_name:
+            merged_name = f"{sanitize_filename(data_element_name)}_all_data_elements_merged_output"
         else:
-            print("  No output files were successfully read for merging.")
+            merged_name = "all_data_elements_merged_output"
+        
+        merged_filename = save_output(merged_df, merged_name, 'xlsx' if EXPORT_XLSX else 'parquet')
+        print(f"\nMerged file saved: {merged_filename}")
+        print(f"  Total rows in merged file: {len(merged_df)}")
+        print(f"  Total columns: {len(merged_df.columns)}")
+        print(f"  Data elements included: {', '.join(set(merged_df['data_element_key'].unique()))}")
     
     # Print overall summary
     print(f"\n{'='*80}")
@@ -987,8 +1269,9 @@ def main():
     print(f"  Total rows processed: {total_rows}")
     print(f"  Total successfully matched: {total_matched}")
     print(f"  Total unmatched: {total_rows - total_matched}")
-    if processed_output_files:
-        print(f"  Individual output files created: {len(processed_output_files)}")
+    if processed_results:
+        if PER_ELEMENT_OUTPUT != 'none':
+            print(f"  Individual output files created: {len(processed_results)}")
         if merged_filename:
             print(f"  Merged output file created: {merged_filename}")
 
@@ -1,6 +1,10 @@
+import csv
 import json
 import requests as rq
 import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 def replace_org_unit(data, ou_value):
     if isinstance(data, dict):
@@ -13,6 +17,154 @@ def replace_org_unit(data, ou_value):
         for item in data:
             replace_org_unit(item, ou_value)
 
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def load_ledger(ledger_file):
+    # Latest result per TEI from the ledger of previous runs
+    results = {}
+    if os.path.exists(ledger_file):
+        with open(ledger_file, "r", newline="") as file:
+            for row in csv.DictReader(file):
+                results[row["tei"]] = row
+    return results
+
+def write_ledger(ledger_file, rows):
+    new_file = not os.path.exists(ledger_file)
+    with open(ledger_file, "a", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["tei", "status", "stage", "message", "timestamp"])
+        if new_file:
+            writer.writeheader()
+        for tei, status, stage, message in rows:
+            writer.writerow({"tei": tei, "status": status, "stage": stage, "message": message,
+                             "timestamp": datetime.now().isoformat(timespec="seconds")})
+
+def get_session(dhis_uname, dhis_pwd, pool_size):
+    session = rq.Session()
+    session.auth = (dhis_uname, dhis_pwd)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def fetch_teis(session, base_url, teis):
+    # Fetch a chunk of TEIs in one request
+    response = session.get(f"{base_url}api/trackedEntityInstances.json",
+                           params={"trackedEntityInstance": ";".join(teis), "fields": "*",
+                                   "ouMode": "ACCESSIBLE", "paging": "false"})
+    response.raise_for_status()
+    return response.json().get("trackedEntityInstances", [])
+
+def post_teis(session, tei_url, teis_data):
+    # Post a batch of TEIs and return {tei: error message or None}
+    r = session.post(url=tei_url, json={"trackedEntityInstances": teis_data})
+    if r.status_code not in (200, 409):
+        r.raise_for_status()
+    summaries = r.json().get("response", {}).get("importSummaries", [])
+    by_reference = {summary.get("reference"): summary for summary in summaries}
+    errors = {}
+    for tei_data in teis_data:
+        tei_uid = tei_data["trackedEntityInstance"]
+        summary = by_reference.get(tei_uid)
+        if summary is None:
+            errors[tei_uid] = "No import summary returned"
+        elif summary.get("status") == "ERROR":
+            conflicts = "; ".join(f"{c.get('object')}: {c.get('value')}" for c in summary.get("conflicts", []))
+            errors[tei_uid] = summary.get("description") or conflicts or "Import failed"
+        else:
+            errors[tei_uid] = None
+    return errors
+
+def transfer_ownership(session, base_url, tei_uid, program, ou_destination):
+    r2 = session.put(url=f"{base_url}api/tracker/ownership/transfer",
+                     params={'trackedEntityInstance': tei_uid, 'program': program, 'ou': ou_destination})
+    r2.raise_for_status()
+    return r2.status_code
+
+def move_teis_bulk(config, teis_to_move):
+    """
+    Move TEIs in bulk: fetch them in chunks, post them in batches and transfer ownership concurrently.
+    Each TEI's result is appended to the ledger file; TEIs already moved in a previous run are skipped,
+    so running the script again retries only the failed ones.
+    """
+    base_url = config["base_url"]
+    ou_destination = config["ou_destination"]
+    tei_url = f"{base_url}api/trackedEntityInstances/"
+    fetch_chunk_size = config.get("fetch_chunk_size", 50)
+    post_batch_size = config.get("post_batch_size", 50)
+    transfer_workers = config.get("transfer_workers", 8)
+    ledger_file = config.get("ledger_file", "move_teis_ledger.csv")
+    session = get_session(config["dhis_uname"], config["dhis_pwd"], max(10, transfer_workers))
+
+    done = {tei for tei, row in load_ledger(ledger_file).items() if row["status"] == "moved"}
+    pending = [tei for tei in dict.fromkeys(teis_to_move) if tei not in done]
+    print(f"Moving {len(pending)} TEIs ({len(done & set(teis_to_move))} already moved according to {ledger_file})")
+
+    moved = 0
+    for chunk in chunks(pending, fetch_chunk_size):
+        ledger_rows = []
+        try:
+            fetched = fetch_teis(session, base_url, chunk)
+        except (rq.exceptions.RequestException, ValueError) as e:
+            print(f"Failed to retrieve TEIs {chunk}: {e}")
+            write_ledger(ledger_file, [(tei, "failed", "fetch", str(e)) for tei in chunk])
+            continue
+
+        # Replace orgUnit values, TEIs need an enrollment for the ownership transfer
+        programs = {}
+        to_post = []
+        for tei_data in fetched:
+            tei_uid = tei_data.get("trackedEntityInstance")
+            try:
+                programs[tei_uid] = tei_data["enrollments"][0]["program"]
+            except (IndexError, KeyError) as e:
+                print(f"Missing enrollment data for TEI {tei_uid}: {e}")
+                ledger_rows.append((tei_uid, "failed", "fetch", f"Missing enrollment data: {e}"))
+                continue
+            replace_org_unit(tei_data, ou_destination)
+            to_post.append(tei_data)
+        fetched_uids = {tei_data.get("trackedEntityInstance") for tei_data in fetched}
+        for tei in chunk:
+            if tei not in fetched_uids:
+                print(f"Failed to retrieve TEI {tei}: not found")
+                ledger_rows.append((tei, "failed", "fetch", "Not found"))
+
+        # Post TEIs in batches
+        posted = []
+        for batch in chunks(to_post, post_batch_size):
+            try:
+                errors = post_teis(session, tei_url, batch)
+            except (rq.exceptions.RequestException, ValueError) as e:
+                print(f"Failed to post {len(batch)} TEIs: {e}")
+                ledger_rows.extend((tei_data["trackedEntityInstance"], "failed", "post", str(e)) for tei_data in batch)
+                continue
+            for tei_uid, error in errors.items():
+                if error:
+                    print(f"Failed to post TEI {tei_uid}: {error}")
+                    ledger_rows.append((tei_uid, "failed", "post", error))
+                else:
+                    posted.append(tei_uid)
+        print(f"Transfer Events for {len(posted)} of {len(chunk)} TEIs")
+
+        # Transfer ownership concurrently
+        with ThreadPoolExecutor(max_workers=transfer_workers) as executor:
+            futures = {
+                tei_uid: executor.submit(transfer_ownership, session, base_url, tei_uid, programs[tei_uid], ou_destination)
+                for tei_uid in posted
+            }
+            for tei_uid, future in futures.items():
+                try:
+                    status_code = future.result()
+                    ledger_rows.append((tei_uid, "moved", "transfer", f"Status Code: {status_code}"))
+                    moved += 1
+                except rq.exceptions.RequestException as e:
+                    print(f"Failed to transfer ownership for TEI {tei_uid}: {e}")
+                    ledger_rows.append((tei_uid, "failed", "transfer", str(e)))
+        write_ledger(ledger_file, ledger_rows)
+
+    print(f"Moved {moved} of {len(pending)} TEIs, see {ledger_file} for the result of each TEI")
+
 def main():
     config_file_path = "config.json"
     
@@ -30,6 +182,11 @@ def main():
     ou_destination = config["ou_destination"]
     teis_to_move = config["teis_to_move"]
 
+    # Bulk mode: chunked fetches, batched posts and concurrent ownership transfers
+    if config.get("bulk_mode", False):
+        move_teis_bulk(config, teis_to_move)
+        return
+
     # URL for TEI operations
     tei_url = f"{base_url}api/trackedEntityInstances/"
 
@@ -1,9 +1,22 @@
 import os
+import re
 import json
+import math
+import time
+import hashlib
+import operator
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+try:
+    import pandas as pd
+except ImportError:  # pandas is optional, filters are then evaluated event by event
+    pd = None
+
 # Set up logging to display info messages on the console
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -29,153 +42,632 @@ def load_config(config_path):
         logging.error("Error decoding the configuration file.")
         return None
 
-def configure_url(config):
+# Filter conditions that can be run by the server, mapped to the events API filter operator
+PUSHDOWN_OPERATORS = {
+    'equals': 'EQ',
+    'in': 'IN',
+}
+
+
+def plan_filters(filters, pushdown=True):
+    """
+    Decide where each filter runs: conditions the events API supports are sent as server-side filter= parameters,
+    the others are evaluated locally. `not_equal`, `is_null` and `not_null` stay local since the server drops events
+    without a value for the data element, while locally those events match; `regex` has no server equivalent.
+    `gt` and `lt` stay local because the server compares text data elements as text ("10" < "9") where the script
+    compares numbers, and an event the server drops can not be brought back by the local check. Pushed filters are
+    still checked locally, which only ever narrows the server result.
+    
+    Args:
+    filters (list): List of filter conditions specified in the config.
+    pushdown (bool): Send supported filters to the server.
+    
+    Returns:
+    list: Server-side filter parameter values (dataElement:OPERATOR:value).
+    """
+    server_filters = []
+    logging.info("Filter plan:")
+    for filter in filters:
+        if filter['condition'] == 'in' and not isinstance(filter.get('value'), list):
+            raise ValueError(f"The value of the 'in' filter on {filter['dataElement']} must be a list")
+        server_operator = PUSHDOWN_OPERATORS.get(filter['condition'])
+        value = filter.get('value', '')
+        value = ';'.join(str(item) for item in value) if isinstance(value, list) else str(value)
+        # ':' separates the parts of a filter parameter and can not be escaped
+        if pushdown and server_operator and ':' not in value:
+            server_filters.append(f"{filter['dataElement']}:{server_operator}:{value}")
+            where = f"server (filter={server_filters[-1]})"
+        else:
+            where = "local"
+        logging.info(f"  {filter['dataElement']} {filter['condition']} {filter.get('value')!r}: {where}")
+    return server_filters
+
+
+def configure_url(config, server_filters=None, updated_since=None):
     """
     Configure the base URL for fetching events using parameters from the configuration.
     This URL will be used as a template for pagination.
     
     Args:
     config (dict): Configuration dictionary containing base_url, program, programStage, and pageSize.
+    server_filters (list): Server-side filter parameter values from plan_filters.
+    updated_since (str): Only fetch events updated since this timestamp (lastUpdatedStartDate).
     
     Returns:
     str: Base URL template for event fetching.
     """
-    return (f"{config['base_url']}events.json?program={config['program']}&programStage={config['programStage']}"
+    url = (f"{config['base_url']}events.json?program={config['program']}&programStage={config['programStage']}"
         f"&fields=storedBy,enrollment,event,program,programStage,orgUnit,trackedEntityInstance,"
-        f"occurredAt,dataValues[dataElement,value],updatedAt&pageSize={config['pageSize']}")
+        f"occurredAt,dataValues[dataElement,value],updatedAt,lastUpdated&pageSize={config['pageSize']}")
+    for server_filter in server_filters or []:
+        url += f"&filter={quote(server_filter, safe=':')}"
+    if updated_since:
+        url += f"&lastUpdatedStartDate={quote(updated_since)}"
+    return url
 
 
-def fetch_events(base_url, config):
+def watermark_key(config):
     """
-    Fetch all events using pagination.
+    Key of the watermark of the configured server, program and program stage, filters and data elements.
+    Changing the filters or the new data elements starts a new watermark, so older events that now match
+    are not skipped.
+    """
+    selection = json.dumps([config.get('filters', []), config.get('data_elements', [])], sort_keys=True)
+    digest = hashlib.sha1(selection.encode('utf-8')).hexdigest()[:12]
+    return f"{config['base_url']}|{config['program']}|{config['programStage']}|{digest}"
+
+
+def load_watermark(config):
+    """
+    Load the last updated timestamp of the events handled by the previous successful incremental run.
     
     Args:
-    base_url (str): Base URL for fetching events, formatted to include initial query parameters except for page.
-    config (dict): Configuration dictionary containing authentication credentials and pageSize.
+    config (dict): Configuration dictionary containing base_url, program, programStage and watermark_file.
     
     Returns:
-    list: All fetched events.
+    str: Watermark timestamp, or None on the first run.
     """
-    all_events = []
-    page = 1
-    pageSize = config['pageSize']  # Ensure this is correctly set in the config dictionary
+    watermark_file = config.get('watermark_file', 'watermarks.json')
+    if not os.path.exists(watermark_file):
+        return None
+    try:
+        with open(watermark_file, 'r') as file:
+            return json.load(file).get(watermark_key(config))
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable watermark file {watermark_file}: {e}")
+        return None
 
-    while True:
-        # Properly include pageSize in the URL
-        url = f"{base_url}&page={page}"
+
+def save_watermark(config, watermark):
+    """
+    Store the last updated timestamp of the events handled by this run for the next incremental run.
+    
+    Args:
+    config (dict): Configuration dictionary containing base_url, program, programStage and watermark_file.
+    watermark (str): Highest last updated timestamp of the fetched events.
+    """
+    watermark_file = config.get('watermark_file', 'watermarks.json')
+    watermarks = {}
+    if os.path.exists(watermark_file):
         try:
-            logging.info(f"Fetching events from page {page}...")
-            response = requests.get(url, auth=(config['dhis_uname'], config['dhis_pwd']))
+            with open(watermark_file, 'r') as file:
+                watermarks = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            pass
+    watermarks[watermark_key(config)] = watermark
+    with open(watermark_file, 'w') as file:
+        json.dump(watermarks, file, indent=4)
+    logging.info(f"Watermark saved: {watermark}")
+
+
+def track_watermark(events, state):
+    """
+    Pass events through while recording the highest last updated timestamp in state['watermark'].
+    """
+    for event in events:
+        updated = event.get('updatedAt') or event.get('lastUpdated')
+        if updated and updated > (state.get('watermark') or ''):
+            state['watermark'] = updated
+        yield event
+
+
+def get_session(config):
+    """
+    Create a session shared by all requests, reusing pooled connections to the server.
+    
+    Args:
+    config (dict): Configuration dictionary containing authentication credentials and fetch_workers.
+    
+    Returns:
+    requests.Session: Authenticated session.
+    """
+    session = requests.Session()
+    session.auth = (config['dhis_uname'], config['dhis_pwd'])
+    pool_size = max(10, config.get('fetch_workers', 4))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_page(session, base_url, page, retries=3, extra_params='', timeout=300):
+    """
+    Fetch a single page of events, retrying with a growing delay on failure.
+    
+    Args:
+    session (requests.Session): Session used for the request.
+    base_url (str): Base URL for fetching events, formatted to include initial query parameters except for page.
+    page (int): Page number to fetch.
+    retries (int): Number of retries after the first failed attempt.
+    extra_params (str): Extra query parameters appended to the URL.
+    timeout (int): Seconds to wait for the server before the attempt fails.
+    
+    Returns:
+    dict: Page response from the server.
+    """
+    url = f"{base_url}&page={page}{extra_params}"
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout)
             response.raise_for_status()
-            data = response.json()
-            all_events.extend(data['events'])
-            if len(data['events']) < pageSize:
-                break  # Exit loop if last page
-            page += 1
+            return response.json()
         except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to fetch events: {e}")
-            break
+            if attempt == retries:
+                raise
+            logging.warning(f"Failed to fetch page {page} ({e}), retrying ({attempt + 1}/{retries})...")
+            time.sleep(2 ** attempt)
+
+
+def fetch_events(base_url, config, session=None, stats=None):
+    """
+    Fetch all events using pagination.
+    The first page also asks for the page count (totalPages=true), the remaining pages are then fetched
+    concurrently by fetch_workers threads. Events are yielded page by page, in page order, so only a few
+    pages are held in memory at a time.
+    
+    Args:
+    base_url (str): Base URL for fetching events, formatted to include initial query parameters except for page.
+    config (dict): Configuration dictionary containing authentication credentials, pageSize,
+                   fetch_workers (default 4), fetch_retries (default 3) and request_timeout (default 300).
+    session (requests.Session): Session to use, a new one is created if not given.
+    stats (dict): If given, the number of pages that could not be fetched is counted in stats['failed_pages'].
+    
+    Yields:
+    dict: Fetched events.
+    """
+    session = session or get_session(config)
+    stats = stats if stats is not None else {}
+    stats.setdefault('failed_pages', 0)
+    workers = max(1, config.get('fetch_workers', 4))
+    retries = config.get('fetch_retries', 3)
+    timeout = config.get('request_timeout', 300)
+    pageSize = config['pageSize']  # Ensure this is correctly set in the config dictionary
+    total_events = 0
+
+    try:
+        logging.info("Fetching events from page 1...")
+        data = fetch_page(session, base_url, 1, retries, extra_params='&totalPages=true', timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to fetch events: {e}")
+        stats['failed_pages'] += 1
+        return
+    total_events += len(data['events'])
+    yield from data['events']
+
+    page_count = data.get('pager', {}).get('pageCount')
+    if page_count is None:
+        # The server did not report the page count, page sequentially until a short page
+        page = 1
+        while len(data['events']) >= pageSize:
+            page += 1
+            try:
+                logging.info(f"Fetching events from page {page}...")
+                data = fetch_page(session, base_url, page, retries, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Failed to fetch events: {e}")
+                stats['failed_pages'] += 1
+                break
+            total_events += len(data['events'])
+            yield from data['events']
+    else:
+        logging.info(f"Fetching {page_count} pages with {workers} workers...")
+        pages = iter(range(2, page_count + 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of pages in flight and hand them over in page order
+            pending = []
+            for page in pages:
+                pending.append((page, executor.submit(fetch_page, session, base_url, page, retries, '', timeout)))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                page, future = pending.pop(0)
+                next_page = next(pages, None)
+                if next_page is not None:
+                    pending.append((next_page, executor.submit(fetch_page, session, base_url, next_page, retries, '',
+                                                               timeout)))
+                try:
+                    page_events = future.result()['events']
+                except requests.exceptions.RequestException as e:
+                    logging.error(f"Failed to fetch events from page {page}: {e}")
+                    stats['failed_pages'] += 1
+                    continue
+                total_events += len(page_events)
+                yield from page_events
+
+    logging.info(f"Total events fetched: {total_events}")
+
+
+
+# Estimated share of events each condition rejects, most selective conditions are checked first
+FILTER_SELECTIVITY = {
+    'equals': 0,
+    'in': 1,
+    'regex': 2,
+    'gt': 3,
+    'lt': 3,
+    'is_null': 4,
+    'not_null': 5,
+    'not_equal': 6,
+}
+
+COMPARISONS = {
+    'gt': operator.gt,
+    'lt': operator.lt,
+}
+
+
+def to_number(value):
+    """
+    Numeric value of a data or filter value, None when it is not a finite number. Used by both the per-event
+    and the columnar filters so they agree on what counts as a number ('nan', 'inf' and '1_000' do not).
+    """
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or '_' in str(value):
+        return None
+    return number
+
+
+def compare(value, target, compare_operator):
+    """
+    Compare a data value with a filter value, as numbers when both are numeric, otherwise as strings
+    (which also orders ISO dates). Missing values never match.
+    """
+    if value is None:
+        return False
+    number, target_number = to_number(value), to_number(target)
+    if number is not None and target_number is not None:
+        return compare_operator(number, target_number)
+    return compare_operator(str(value), str(target))
+
+
+def compile_condition(condition, target):
+    """
+    Resolve a filter condition to a callable taking the data element value (None if the event has no value).
+    
+    Args:
+    condition (str): equals, not_equal, is_null, not_null, in, gt, lt or regex.
+    target: Filter value from the config (a list for 'in', a pattern for 'regex').
+    
+    Returns:
+    callable: Check returning True when the value passes the filter.
+    """
+    if condition == 'equals':
+        return lambda value: value == target
+    if condition == 'not_equal':
+        return lambda value: value != target
+    if condition == 'is_null':
+        return lambda value: value is None
+    if condition == 'not_null':
+        return lambda value: value is not None
+    if condition == 'in':
+        if not isinstance(target, list):
+            raise ValueError(f"The 'in' filter value must be a list, got {target!r}")
+        # Data values are text; compare as the server does for the pushed IN filter (JSON [1, 2] -> '1', '2')
+        allowed = {str(item) for item in target}
+        return lambda value: value in allowed
+    if condition in COMPARISONS:
+        compare_operator = COMPARISONS[condition]
+        return lambda value: compare(value, target, compare_operator)
+    if condition == 'regex':
+        pattern = re.compile(target)
+        return lambda value: value is not None and pattern.search(value) is not None
+    raise ValueError(f"Unknown filter condition '{condition}'")
+
 
-    logging.info(f"Total events fetched: {len(all_events)}")
-    return all_events
+def compile_filters(filters):
+    """
+    Compile the config filters once into a predicate over events. Conditions are resolved to callables and
+    ordered by selectivity so most events are rejected by the first check.
+    
+    Args:
+    filters (list): List of filter conditions specified in the config.
+    
+    Returns:
+    tuple: (predicate taking an event and returning True when it passes all filters,
+            set of the data elements the filters need)
+    """
+    ordered = sorted(filters, key=lambda filter: FILTER_SELECTIVITY.get(filter['condition'], len(FILTER_SELECTIVITY)))
+    checks = [(filter['dataElement'], compile_condition(filter['condition'], filter.get('value'))) for filter in ordered]
+    required = {data_element for data_element, _ in checks}
+
+    def predicate(event):
+        values = {dv['dataElement']: dv['value'] for dv in event['dataValues'] if dv['dataElement'] in required}
+        for data_element, check in checks:
+            if not check(values.get(data_element)):
+                return False
+        return True
 
+    return predicate, required
 
 
-def process_events_with_filters(events, filters, new_data_elements):
+def events_to_table(events, data_elements):
+    """
+    Build a columnar table of events: one row per event, one column per data element (None if the event has no value).
+    """
+    return pd.DataFrame(
+        [{dv['dataElement']: dv['value'] for dv in event['dataValues'] if dv['dataElement'] in data_elements}
+         for event in events],
+        columns=sorted(data_elements),
+        dtype=object,
+    )
+
+
+def filter_mask(table, filters):
+    """
+    Evaluate the filters over a columnar event table at once, with the same semantics as compile_filters.
+    
+    Args:
+    table (pandas.DataFrame): Table built by events_to_table.
+    filters (list): List of filter conditions specified in the config.
+    
+    Returns:
+    pandas.Series: Boolean mask of the rows that pass all filters.
+    """
+    mask = pd.Series(True, index=table.index)
+    for filter in filters:
+        column = table[filter['dataElement']]
+        condition = filter['condition']
+        target = filter.get('value')
+        if condition == 'equals':
+            mask &= column == target
+        elif condition == 'not_equal':
+            mask &= column != target
+        elif condition == 'is_null':
+            mask &= column.isna()
+        elif condition == 'not_null':
+            mask &= column.notna()
+        elif condition == 'in':
+            mask &= column.isin([str(item) for item in target])
+        elif condition in COMPARISONS:
+            compare_operator = COMPARISONS[condition]
+            # String comparison first, numeric comparison where both sides are numbers
+            result = column.notna() & compare_operator(column.where(column.notna(), '').astype(str), str(target))
+            target_number = to_number(target)
+            if target_number is not None:
+                numbers = column.map(to_number)
+                numeric = numbers.notna()
+                result[numeric] = compare_operator(numbers[numeric].astype(float), target_number)
+            mask &= result
+        elif condition == 'regex':
+            mask &= column.str.contains(target, regex=True, na=False)
+        else:
+            raise ValueError(f"Unknown filter condition '{condition}'")
+    return mask
+
+
+def iter_matching_events(events, filters, chunk_size=0):
+    """
+    Yield the events that pass all filters.
+    With chunk_size set (and pandas installed) events are evaluated in columnar chunks of that size,
+    otherwise with the compiled predicate one by one.
+    """
+    predicate, required = compile_filters(filters)
+    if not chunk_size or pd is None:
+        yield from filter(predicate, events)
+        return
+
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) >= chunk_size:
+            mask = filter_mask(events_to_table(chunk, required), filters)
+            yield from (event for event, keep in zip(chunk, mask) if keep)
+            chunk = []
+    if chunk:
+        mask = filter_mask(events_to_table(chunk, required), filters)
+        yield from (event for event, keep in zip(chunk, mask) if keep)
+
+
+def process_events_with_filters(events, filters, new_data_elements, chunk_size=0):
     """
     Process and update events based on dynamic filtering conditions from the configuration and append new data elements.
     
     Args:
-    events (dict): Dictionary of events fetched from DHIS2.
+    events (iterable): Events fetched from DHIS2, e.g. the fetch_events generator.
     filters (list): List of filter conditions specified in the config.
     new_data_elements (list): List of new data elements to append to each event that passes the filters.
+    chunk_size (int): Evaluate the filters over columnar chunks of this many events (requires pandas), 0 to disable.
     
     Returns:
     list: Updated events that meet all the specified conditions.
     """
     logging.info("Processing events based on filters...")
     filtered_and_updated_events = []
+    already_updated = 0
     
-    for event in events:
-        data_values = event['dataValues']
-        data_elements = {dv['dataElement']: dv['value'] for dv in data_values}
-        
-        match = all(
-            (filter['condition'] == 'equals' and data_elements.get(filter['dataElement']) == filter['value']) or
-            (filter['condition'] == 'not_equal' and data_elements.get(filter['dataElement']) != filter['value']) or
-            (filter['condition'] == 'is_null' and data_elements.get(filter['dataElement']) is None)
-            for filter in filters
-        )
-        
-        if match:
-            # Append new data elements
-            for new_element in new_data_elements:
+    for event in iter_matching_events(events, filters, chunk_size):
+        current_values = {dv['dataElement']: dv for dv in event['dataValues']}
+        # Skip events that already have all the new values (e.g. updated by a previous run)
+        if new_data_elements and all(new_element['dataElement'] in current_values
+                                     and current_values[new_element['dataElement']]['value'] == new_element['value']
+                                     for new_element in new_data_elements):
+            already_updated += 1
+            continue
+        # Set the new data elements, replacing a value the event already has
+        for new_element in new_data_elements:
+            if new_element['dataElement'] in current_values:
+                current_values[new_element['dataElement']]['value'] = new_element['value']
+            else:
                 event['dataValues'].append({
                     'dataElement': new_element['dataElement'],
                     'value': new_element['value']
                 })
-            filtered_and_updated_events.append(event)
+        filtered_and_updated_events.append(event)
     
+    if already_updated:
+        logging.info(f"Skipped {already_updated} events that already have the new data element values.")
     logging.info(f"Updated {len(filtered_and_updated_events)} events to match filter criteria and added new data elements.")
     return filtered_and_updated_events
 
 
 
-def post_event(event, post_url, username, password):
+def log_import_summary(event_id, summary, status_code):
     """
-    Post a single event to the DHIS2 using the specified credentials.
+    Log the import outcome of a single event from its entry in the batch importSummaries.
     
     Args:
-    event (dict): The event to post.
-    post_url (str): The URL to post the event to.
-    username (str): DHIS2 username.
-    password (str): DHIS2 password.
+    event_id (str): UID of the event.
+    summary (dict): Import summary of the event.
+    status_code (int): HTTP status code of the batch request.
+    
+    Returns:
+    bool: True when the event was imported.
+    """
+    import_count = summary.get('importCount', {})
+    imported = import_count.get('imported', 0) + import_count.get('updated', 0)
+    ignored = import_count.get('ignored', 0)
+    if summary.get('status') == 'ERROR' or ignored > 0:
+        logging.error(f"Failed to post event {event_id}: {status_code} - Ignored data elements found.")
+        if summary.get('description'):
+            logging.error(f"Description: {summary.get('description')}")
+        for conflict in summary.get('conflicts', []):
+            logging.error(f"Description: {conflict.get('object')} - {conflict.get('value')}")
+        return False
+    if summary.get('status') == 'WARNING' and imported > 0:
+        logging.info(f"Event {event_id} posted with warnings, but data was imported.")
+    return True
+
 
+def wait_for_import_job(session, base_url, job, poll_interval=5, job_timeout=3600, timeout=300):
+    """
+    Poll an asynchronous event import job until it is completed and return its import summaries.
+    
+    Args:
+    session (requests.Session): Session used for the requests.
+    base_url (str): The base URL of the DHIS2 API.
+    job (dict): The 'response' part of the async import response, with the job id and type.
+    poll_interval (int): Seconds to wait between status checks.
+    job_timeout (int): Seconds to wait for the job to complete.
+    timeout (int): Seconds to wait for the server on each request.
+    
     Returns:
-    tuple: status code and response text from the server.
+    dict: Import summaries of the job.
+    
+    Raises:
+    TimeoutError: When the job did not complete within job_timeout seconds.
+    """
+    job_type = job.get('jobType', 'EVENT_IMPORT')
+    task_url = f"{base_url}system/tasks/{job_type}/{job['id']}"
+    deadline = time.monotonic() + job_timeout
+    while True:
+        response = session.get(task_url, timeout=timeout)
+        response.raise_for_status()
+        notifications = response.json()
+        if any(notification.get('completed') for notification in notifications):
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Import job {job['id']} did not complete in {job_timeout}s")
+        time.sleep(poll_interval)
+    response = session.get(f"{base_url}system/taskSummaries/{job_type}/{job['id']}", timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def post_event_batch(events, post_url, session, async_import=False, base_url=None, poll_interval=5,
+                     job_timeout=3600, timeout=300):
+    """
+    Post a batch of events in a single request and get the outcome of each event from the importSummaries.
+    An event only counts as imported when its import summary says so; an event without a summary has failed.
+    
+    Args:
+    events (list): The events to post.
+    post_url (str): The URL to post the events to.
+    session (requests.Session): Session used for the requests.
+    async_import (bool): Run the import as an asynchronous job (async=true) and poll it until it is done.
+    base_url (str): The base URL of the DHIS2 API, used to poll asynchronous jobs.
+    poll_interval (int): Seconds to wait between job status checks.
+    job_timeout (int): Seconds to wait for an asynchronous job to complete.
+    timeout (int): Seconds to wait for the server on each request.
+
+    Returns:
+    list: (status code, response text, success) for each event, in the order of the events.
     """
     try:
-        response = requests.post(post_url, json={'events': [event]}, auth=(username, password))
-        if response.status_code == 409:
-            # Parse the response body for more details
-            response_data = json.loads(response.text)
-            imported = response_data.get('response', {}).get('imported', 0)
-            ignored = response_data.get('response', {}).get('ignored', 0)
-            descriptions = [summary.get('description') for summary in response_data.get('response', {}).get('importSummaries', [])]
-            
-            # Conditional handling based on 'imported' and 'ignored' values
-            if imported > 0 and ignored == 0:
-                logging.info(f"Event {event['event']} posted with warnings, but data was imported.")
-                return response.status_code, response.text  # Treat this case as less severe or normal.
-            elif ignored > 0:
-                logging.error(f"Failed to post event {event['event']}: {response.status_code} - Ignored data elements found.")
-                for description in descriptions:
-                    logging.error(f"Description: {description}")
-                return response.status_code, response.text
-            
-        elif response.status_code != 200:
-            logging.error(f"Failed to post event {event['event']}: {response.status_code} - {response.text}")
-            return response.status_code, response.text
-        
-        return response.status_code, response.text
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error posting event {event['event']}: {str(e)}")
-        return None
+        response = session.post(post_url, json={'events': events}, params={'async': 'true'} if async_import else None,
+                                timeout=timeout)
+        status_code = response.status_code
+        if status_code not in (200, 201, 202, 409):
+            logging.error(f"Failed to post {len(events)} events: {status_code} - {response.text}")
+            return [(status_code, response.text, False)] * len(events)
+        response_data = response.json()
+        if async_import:
+            response_data = {'response': wait_for_import_job(session, base_url, response_data['response'],
+                                                             poll_interval, job_timeout, timeout)}
+    except (requests.exceptions.RequestException, ValueError, KeyError, TimeoutError) as e:
+        logging.error(f"Error posting {len(events)} events: {str(e)}")
+        return [(None, str(e), False)] * len(events)
 
-def post_all_events(events, post_url, username, password):
+    summaries = response_data.get('response', {}).get('importSummaries', [])
+    summaries_by_event = {summary.get('reference'): summary for summary in summaries if summary.get('reference')}
+    outcomes = []
+    for position, event in enumerate(events):
+        summary = summaries_by_event.get(event['event'])
+        if summary is None and position < len(summaries):
+            summary = summaries[position]
+        if summary is None:
+            logging.error(f"Failed to post event {event['event']}: no import summary returned")
+            outcomes.append((status_code, response.text, False))
+            continue
+        success = log_import_summary(event['event'], summary, status_code)
+        outcomes.append((status_code, json.dumps(summary), success))
+    return outcomes
+
+
+def post_all_events(events, post_url, username, password, batch_size=100, async_import=False, base_url=None,
+                    poll_interval=5, session=None, job_timeout=3600, timeout=300):
     """
-    Post all events to the DHIS2, showing a progress bar.
+    Post all events to the DHIS2 in batches over a single session, showing a progress bar.
 
     Args:
     events (list): List of events to be posted.
     post_url (str): The URL to post the events to.
     username (str): DHIS2 username.
     password (str): DHIS2 password.
+    batch_size (int): Number of events posted per request.
+    async_import (bool): Import each batch as an asynchronous job and poll it until it is done.
+    base_url (str): The base URL of the DHIS2 API, used to poll asynchronous jobs.
+    poll_interval (int): Seconds to wait between job status checks.
+    session (requests.Session): Session to use, a new one is created if not given.
+    job_timeout (int): Seconds to wait for an asynchronous job to complete.
+    timeout (int): Seconds to wait for the server on each request.
+
+    Returns:
+    list: (status code, response text, success) for each event.
     """
+    session = session or get_session({'dhis_uname': username, 'dhis_pwd': password})
+    batch_size = max(1, batch_size)
     responses = []
-    for event in tqdm(events, desc="Posting events"):
-        status, response = post_event(event, post_url, username, password)
-        responses.append((status, response))
+    with tqdm(total=len(events), desc="Posting events") as progress:
+        for start in range(0, len(events), batch_size):
+            batch = events[start:start + batch_size]
+            responses.extend(post_event_batch(batch, post_url, session, async_import, base_url, poll_interval,
+                                              job_timeout, timeout))
+            progress.update(len(batch))
     return responses
 
 def main():
@@ -183,14 +675,40 @@ def main():
     config = load_config(config_path)
     if config:
         post_url = config['base_url'] + "events"
-        url = configure_url(config)
-        events = fetch_events(url, config)
-        if events:
-            filters = config.get('filters', [])
-            new_data_elements = config.get('data_elements', [])
-            filtered_events = process_events_with_filters(events, filters, new_data_elements)
-            responses = post_all_events(filtered_events, post_url, config['dhis_uname'], config['dhis_pwd'])
+        filters = config.get('filters', [])
+        server_filters = plan_filters(filters, config.get('filter_pushdown', True))
+        # In incremental mode only fetch the events updated since the previous successful run
+        incremental = config.get('incremental', False)
+        watermark = load_watermark(config) if incremental else None
+        if watermark:
+            logging.info(f"Incremental run: fetching events updated since {watermark}")
+        url = configure_url(config, server_filters, watermark)
+        session = get_session(config)
+        # Events are streamed from the fetch into the filters
+        fetch_stats = {}
+        watermark_state = {'watermark': watermark}
+        events = track_watermark(fetch_events(url, config, session, fetch_stats), watermark_state)
+        new_data_elements = config.get('data_elements', [])
+        filtered_events = process_events_with_filters(events, filters, new_data_elements,
+                                                      chunk_size=config.get('filter_chunk_size', 0))
+        responses = []
+        if filtered_events:
+            responses = post_all_events(filtered_events, post_url, config['dhis_uname'], config['dhis_pwd'],
+                                        batch_size=config.get('post_batch_size', 100),
+                                        async_import=config.get('async_import', False),
+                                        base_url=config['base_url'],
+                                        poll_interval=config.get('async_poll_interval', 5),
+                                        session=session,
+                                        job_timeout=config.get('async_job_timeout', 3600),
+                                        timeout=config.get('request_timeout', 300))
             logging.info("Finished posting events.")
+        if incremental:
+            failed = sum(1 for _, _, success in responses if not success)
+            if fetch_stats.get('failed_pages') or failed:
+                logging.warning(f"Watermark not updated: {fetch_stats.get('failed_pages', 0)} pages could not be "
+                                f"fetched and {failed} events failed to post, the next run will retry them.")
+            elif watermark_state['watermark'] and watermark_state['watermark'] != watermark:
+                save_watermark(config, watermark_state['watermark'])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,55 @@
+"""
+Check that the columnar filters (filter_chunk_size > 0, pandas) select the same events as the per-event
+filters, over events with edge-case values: missing values, numbers, text, 'nan', 'inf', '1_000', ISO dates.
+
+Usage:
+    python check_filter_paths.py
+"""
+import importlib.util
+import itertools
+import os
+
+spec = importlib.util.spec_from_file_location(
+    "update_events", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Update Events.py"))
+update_events = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(update_events)
+
+VALUES = [None, '', '0', '9', '10', '9.5', '-1', '1e3', 'nan', 'NaN', 'inf', '-inf', '1_000', ' 7 ',
+          'abc', 'Positive', '2024-01-15', '2023-12-31']
+FILTER_CASES = [
+    ('equals', '9'), ('not_equal', '9'), ('is_null', None), ('not_null', None),
+    ('in', ['9', '10', 'abc']), ('in', [9, 10]), ('gt', '9'), ('lt', '9'), ('gt', 'b'), ('lt', '2024-01-01'),
+    ('gt', 'nan'), ('regex', '^[0-9]+$'),
+]
+
+
+def make_events():
+    # Two data elements, every combination of values
+    events = []
+    for n, (first, second) in enumerate(itertools.product(VALUES, repeat=2)):
+        data_values = [{'dataElement': de, 'value': value}
+                       for de, value in (('deA', first), ('deB', second)) if value is not None]
+        events.append({'event': f'ev{n}', 'dataValues': data_values})
+    return events
+
+
+def main():
+    events = make_events()
+    cases = [[{'dataElement': 'deA', 'condition': condition, 'value': value}] for condition, value in FILTER_CASES]
+    # Pairs of conditions on both data elements
+    cases += [[{'dataElement': 'deA', 'condition': a, 'value': va}, {'dataElement': 'deB', 'condition': b, 'value': vb}]
+              for (a, va), (b, vb) in itertools.combinations(FILTER_CASES, 2)]
+    mismatches = 0
+    for filters in cases:
+        per_event = [event['event'] for event in update_events.iter_matching_events(events, filters, chunk_size=0)]
+        columnar = [event['event'] for event in update_events.iter_matching_events(events, filters, chunk_size=50)]
+        if per_event != columnar:
+            mismatches += 1
+            print(f"MISMATCH {filters}: {len(per_event)} per event, {len(columnar)} columnar, "
+                  f"differing: {sorted(set(per_event) ^ set(columnar))[:10]}")
+    print(f"{len(cases)} filter sets over {len(events)} events, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())